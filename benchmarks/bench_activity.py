@@ -0,0 +1,61 @@
+# coding:utf-8
+"""
+Throughput of the filtered activity count engine on long recordings.
+
+    python benchmarks/bench_activity.py [days] [rate]
+
+Processes synthetic wrist data one day at a time, the way a week long SD card
+recording is read, then streams the first hour again in notification sized
+batches and checks that live and offline counts are identical.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+
+from src.gallery.app.stream.activity import ActivityCountEngine
+
+
+def synthetic(n, rate, rng):
+    t = np.arange(n) / rate
+    values = rng.normal(0, 0.05, (3, n))
+    values[0] += 0.3 * np.sin(2 * np.pi * 0.8 * t)
+    values[2] += 1.0
+    return values
+
+
+def main():
+    days = float(sys.argv[1]) if len(sys.argv) > 1 else 7
+    rate = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    rng = np.random.default_rng(0)
+    day = rate * 86400
+
+    engine = ActivityCountEngine(rate)
+    elapsed = 0.0
+    remaining = int(days * day)
+    while remaining > 0:
+        chunk = synthetic(min(day, remaining), rate, rng)
+        start = time.perf_counter()
+        engine.process(chunk)
+        elapsed += time.perf_counter() - start
+        remaining -= chunk.shape[1]
+    samples = int(days * day)
+    print(f"{days:g} days at {rate}Hz: {samples} samples, {len(engine.get_activity_counts())} epochs "
+          f"in {elapsed:.2f}s ({samples / elapsed / 1e6:.1f}M samples/s)")
+
+    hour = synthetic(rate * 3600, rate, rng)
+    offline = ActivityCountEngine(rate).add_batch(*hour)
+    live = ActivityCountEngine(rate)
+    i = 0
+    while i < hour.shape[1]:
+        n = int(rng.integers(1, 64))
+        live.process(hour[:, i:i + n])
+        i += n
+    print(f"live == offline: {np.array_equal(live.get_activity_counts(), offline)}")
+
+
+if __name__ == "__main__":
+    main()
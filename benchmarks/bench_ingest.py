@@ -0,0 +1,57 @@
+# coding:utf-8
+"""
+Headless ingest load test with simulated wearables, no Bluetooth adapter needed.
+
+    python benchmarks/bench_ingest.py [devices] [rate] [seconds]
+
+Connects the simulated devices through ``SessionManager``, drains their pipelines
+like the streaming view timer does and prints the stage instrumentation. Run the
+app with ``WEARABLE_SIMULATOR=devices@rate`` to load the rendering side as well.
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PyQt5.QtCore import QCoreApplication
+from qasync import QEventLoop
+
+from src.gallery.app.ble.session_manager import SessionManager
+from src.gallery.app.ble.simulator import simulated_devices
+from src.gallery.app.common.instrumentation import instrumentation
+
+
+async def run(n, rate, seconds, tick=0.04):
+    sessions = SessionManager()
+    devices = simulated_devices(n, sampling=rate)
+    await sessions.connect_all(devices)
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        await asyncio.sleep(tick)
+        sessions.drain()
+    await sessions.disconnect_all()
+    sessions.drain()
+
+    expected = n * rate * seconds
+    received = sum(s.samples.total for s in sessions)
+    print(f"{n} devices at {rate}Hz for {seconds}s: {received} samples ({received / expected:.0%} of nominal)")
+    for stage, stats in instrumentation.snapshot().items():
+        print(f"{stage:>14}: {stats['count']:8d} {stats['rate']:9.1f}/s "
+              f"mean {stats['mean_ms']:.3f}ms max {stats['max_ms']:.3f}ms")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    rate = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    app = QCoreApplication(sys.argv)
+    loop = QEventLoop(app)
+    asyncio.set_event_loop(loop)
+    with loop:
+        loop.run_until_complete(run(n, rate, seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# coding:utf-8
+"""
+Compare the per message parsing path of the client with the batch parser.
+
+    python benchmarks/bench_parser.py [n_frames]
+
+Live notifications arrive in batches of one or two frames at 30Hz, larger
+batches come from a backlog or an SD card file. The legacy path mirrors the former per message parsing of
+``SearchAndConnectInterface.handle_message_changed`` and
+``DataStreamingInterface.parse_ble_data`` without their ``print`` calls.
+"""
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+from random import uniform
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.gallery.app.stream.parser import parse_frames
+
+
+def make_frames(n, rate=30):
+    start = datetime(2025, 1, 26, 4, 37, 57)
+    frames = []
+    for i in range(n):
+        stamp = (start + timedelta(seconds=i // rate)).strftime("%y%m%d%H%M%S")
+        frames.append(bytearray(
+            f"{stamp},{uniform(-2, 2):.3f},{uniform(-2, 2):.3f},{uniform(-2, 2):.3f}".encode()))
+    return frames
+
+
+def legacy_parse(message):
+    msg = message.decode()
+    if "batt" in msg or "info" in msg:
+        return None
+    if not (14 <= len(msg) <= 38 and 'hwid' not in msg):
+        return None
+    activity_count = None
+    components = msg.split(',')
+    timestamp = int(datetime.strptime(components[0], "%y%m%d%H%M%S").timestamp())
+    try:
+        x = float(components[1])
+        y = float(components[2])
+        z = float(components[3])
+        if len(components) > 4:
+            activity_count = int(components[4])
+    except Exception:
+        activity_count = int(components[1])
+        x = y = z = 0
+    return [timestamp, x, y, z, activity_count]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 30000
+    frames = make_frames(n)
+    expected = [legacy_parse(f) for f in frames]
+    assert expected == parse_frames(frames).to_rows()
+    assert expected[:4] == parse_frames(frames[:4]).to_rows()
+    # counts that do not fit an int64 are rejected the same way by both paths
+    overflow = [frames[0] + b",7", frames[0] + b",inf", frames[0] + b",nan", frames[0] + b",1e19"]
+    small, large = parse_frames(overflow), parse_frames(overflow * 16)
+    assert small.rejected == 3 and large.rejected == 48 and small.to_rows() * 16 == large.to_rows()
+
+    runs = 5
+    cases = {
+        "legacy per message": lambda: [legacy_parse(f) for f in frames],
+        "batch of 1": lambda: [parse_frames(frames[i:i + 1]) for i in range(n)],
+        "batch of 2": lambda: [parse_frames(frames[i:i + 2]) for i in range(0, n, 2)],
+        "batch of 4": lambda: [parse_frames(frames[i:i + 4]) for i in range(0, n, 4)],
+        "batch of 30": lambda: [parse_frames(frames[i:i + 30]) for i in range(0, n, 30)],
+        "single batch": lambda: parse_frames(frames),
+    }
+    print(f"{n} frames, best of {runs}")
+    for name, fn in cases.items():
+        best = min(timeit.repeat(fn, number=1, repeat=runs))
+        print(f"{name:>20}: {best * 1e3:9.2f} ms  {best / n * 1e6:6.2f} us/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# coding:utf-8
+"""
+Frame time of the XYZ plot update over a long session.
+
+    python benchmarks/bench_render.py [hours] [ticks_per_second]
+
+Compares the former list based update of ``DataStreamingInterface.render``
+(append, rebuild ``time_xyz`` with ``list(range(...))``, slice the window out of
+every list, ``setData``) with ``TraceBuffer``, whose window views are handed to
+``setData`` directly, and with the ``MinMaxDecimator`` of an 800 pixel wide
+plot in front of it. The history is filled up to each checkpoint, then the mean
+time of a few hundred updates is measured there. The legacy trace grows until
+its 100k points reset, the buffered one stays flat.
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+import pyqtgraph as pg
+
+from src.gallery.app.stream.decimator import MinMaxDecimator
+from src.gallery.app.stream.trace import TraceBuffer
+
+WIN_SIZE = 60 * 30
+LEGACY_RESET = 100000
+
+
+class LegacyTrace:
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.axes = ([], [], [])
+        self.time_xyz = []
+
+    def fill(self, n):
+        """ keep ``n`` points of history, what is left since the last reset """
+        for axis in self.axes:
+            axis.clear()
+            axis.extend(np.random.uniform(-2, 2, n).tolist())
+
+    def update(self, x, y, z):
+        xaxis, yaxis, zaxis = self.axes
+        if len(xaxis) > LEGACY_RESET:
+            for axis in self.axes:
+                axis.clear()
+        xaxis.append(x)
+        yaxis.append(y)
+        zaxis.append(z)
+        self.time_xyz = list(range(len(xaxis)))
+        start = max(0, len(xaxis) - WIN_SIZE)
+        for line, axis in zip(self.lines, self.axes):
+            line.setData(self.time_xyz[start:len(xaxis)], axis[start:len(xaxis)])
+
+
+class BufferedTrace:
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.trace = TraceBuffer(WIN_SIZE)
+
+    def fill(self, n):
+        """ add ``n`` points of history """
+        self.trace.extend(np.random.uniform(-2, 2, (3, n)))
+
+    def update(self, x, y, z):
+        self.trace.append(x, y, z)
+        time_xyz = self.trace.x()
+        for channel, line in enumerate(self.lines):
+            line.setData(time_xyz, self.trace.y(channel))
+
+
+class DecimatedTrace(BufferedTrace):
+
+    def __init__(self, lines, columns=800):
+        super().__init__(lines)
+        self.decimator = MinMaxDecimator(WIN_SIZE, columns)
+
+    def fill(self, n):
+        super().fill(n)
+        self.decimator.rebuild(self.trace.x(), self.trace.values())
+
+    def update(self, x, y, z):
+        point = np.array([[x], [y], [z]], dtype=float)
+        self.trace.extend(point)
+        self.decimator.extend(self.trace.x()[-1:], point)
+        time_xyz = self.decimator.x()
+        for channel, line in enumerate(self.lines):
+            line.setData(time_xyz, self.decimator.y(channel))
+
+
+def frame_ms(trace, repeat=200):
+    values = np.random.uniform(-2, 2, (repeat, 3)).tolist()
+    it = iter(values)
+    seconds = timeit.timeit(lambda: trace.update(*next(it)), number=repeat)
+    return seconds / repeat * 1e3
+
+
+def main():
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+    ticks_per_second = int(sys.argv[2]) if len(sys.argv) > 2 else 23
+    app = pg.mkQApp()
+    plot = pg.PlotWidget()
+    traces = {
+        "legacy": LegacyTrace([plot.plot() for _ in range(3)]),
+        "buffered": BufferedTrace([plot.plot() for _ in range(3)]),
+        "decimated": DecimatedTrace([plot.plot() for _ in range(3)]),
+    }
+
+    total_ticks = int(hours * 3600 * ticks_per_second)
+    checkpoints = sorted({0, WIN_SIZE, LEGACY_RESET // 2, LEGACY_RESET, total_ticks // 2, total_ticks})
+    print(f"{'ticks':>9} {'session':>8} " + " ".join(f"{name:>10}" for name in traces))
+    done = 0
+    for checkpoint in checkpoints:
+        traces["legacy"].fill(checkpoint if checkpoint <= LEGACY_RESET else checkpoint % LEGACY_RESET)
+        traces["buffered"].fill(checkpoint - done)
+        traces["decimated"].fill(checkpoint - done)
+        done = checkpoint
+        times = [frame_ms(trace) for trace in traces.values()]
+        print(f"{checkpoint:9d} {checkpoint / ticks_per_second / 3600:7.2f}h "
+              + " ".join(f"{t:8.3f}ms" for t in times))
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
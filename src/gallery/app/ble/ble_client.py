@@ -3,33 +3,60 @@
 import asyncio
 from dataclasses import dataclass
 from functools import cached_property
+from typing import List
 
 import bleak
 from PyQt5.QtCore import QObject, pyqtSignal
 from bleak import BleakClient
 from bleak.backends.device import BLEDevice
 
+from .uart_writer import UartWriteQueue
+from ..common.instrumentation import instrumentation
+
 UART_SERVICE_UUID = "6E400001-B5A3-F393-E0A9-E50E24DCCA9E"
 UART_RX_CHAR_UUID = "6E400002-B5A3-F393-E0A9-E50E24DCCA9E"
 UART_TX_CHAR_UUID = "6E400003-B5A3-F393-E0A9-E50E24DCCA9E"
 
-UART_SAFE_SIZE = 20
-
 
 @dataclass
 class QBleakClient(QObject):
     device: BLEDevice
+    # batching mode is on when either limit is set: notifications are collected for
+    # batch_window seconds or until batch_size of them arrived and sent via messagesBatched
+    batch_window: float = 0.0
+    batch_size: int = 0
 
     messageChanged = pyqtSignal(bytearray)
+    messagesBatched = pyqtSignal(list)
     messageDiconnect = pyqtSignal(int)
 
     def __post_init__(self):
         super().__init__()
+        self.notifications_received = 0
+        self.batches_emitted = 0
+        self.max_batch_size = 0
+        self._batch = []  # type: List[bytearray]
+        self._flush_handle = None
+
+    @property
+    def batching(self) -> bool:
+        return self.batch_window > 0 or self.batch_size > 0
+
+    def stats(self) -> dict:
+        return {
+            "notifications_received": self.notifications_received,
+            "batches_emitted": self.batches_emitted,
+            "max_batch_size": self.max_batch_size,
+        }
 
     @cached_property
     def client(self) -> BleakClient:
         return BleakClient(self.device, disconnected_callback=self._handle_disconnect)
 
+    @cached_property
+    def writer(self) -> UartWriteQueue:
+        return UartWriteQueue(self.client)
+
     async def start(self):
         print("Starting bleak client")
         await self.client.connect()
@@ -37,24 +64,52 @@ class QBleakClient(QObject):
 
     async def stop(self):
         print(f"stopping bleak client")
+        self.flush()
         try:
             await self.client.disconnect()
         except asyncio.exceptions.CancelledError as e:
             print(e)
 
-    async def write(self, data):
+    async def write(self, data, response=None):
+        """ short commands are acknowledged, larger payloads are chunked and pipelined """
         try:
-            await self.client.write_gatt_char(UART_RX_CHAR_UUID, data)
-            print(f"sent:{data}")
+            stats = await self.writer.write(data, response)
+            if stats.chunks > 1:
+                print(f"sent {stats.bytes}B in {stats.chunks} chunks, {stats.throughput:.0f}B/s")
+            else:
+                print(f"sent:{data}")
         except bleak.exc.BleakError as e:
             print(e)
             print(f"self.client={self.client}")
 
     def _handle_disconnect(self, arg) -> None:
         print(f"Device was disconnected, goodbye. {arg}")
+        self.flush()
         data = -9
         self.messageDiconnect.emit(data)
 
+    def flush(self) -> None:
+        """ emit the notifications collected so far as one batch """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        self.batches_emitted += 1
+        self.max_batch_size = max(self.max_batch_size, len(batch))
+        self.messagesBatched.emit(batch)
+
     def _handle_read(self, _: int, data: bytearray) -> None:
-        print(f"received:{data}")
-        self.messageChanged.emit(data)
+        self.notifications_received += 1
+        with instrumentation.timer("notify"):
+            instrumentation.log_sampled("notify", "received:{}", data)
+            if not self.batching:
+                self.messageChanged.emit(data)
+                return
+
+            self._batch.append(data)
+            if 0 < self.batch_size <= len(self._batch):
+                self.flush()
+            elif self._flush_handle is None and self.batch_window > 0:
+                self._flush_handle = asyncio.get_event_loop().call_later(self.batch_window, self.flush)
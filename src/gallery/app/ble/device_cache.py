@@ -0,0 +1,84 @@
+# coding:utf-8
+"""
+Persistent cache of the wearables the client already connected to.
+
+Entries live in the ``Bluetooth/KnownDevices`` item of the app config, keyed by
+address. A known device is looked up with a short targeted scan instead of a
+full discovery, the most recently connected one wins when several advertise.
+The caller falls back to a full scan on a miss.
+"""
+import asyncio
+import time
+from typing import List, Optional
+
+from bleak import BleakScanner
+from bleak.backends.device import BLEDevice
+
+from .uart_service import match_nus_uuid
+from ..common.config import cfg
+
+
+class DeviceCache:
+    """ Known devices, most recently connected first """
+
+    def __init__(self, max_devices=32):
+        self.max_devices = max_devices
+
+    def entries(self) -> List[dict]:
+        devices = cfg.get(cfg.knownDevices) or {}
+        return sorted(({"address": a, **e} for a, e in devices.items()),
+                      key=lambda e: e.get("last_seen", 0), reverse=True)
+
+    def __len__(self):
+        return len(cfg.get(cfg.knownDevices) or {})
+
+    def __contains__(self, address):
+        return address in (cfg.get(cfg.knownDevices) or {})
+
+    def remember(self, address: str, name: Optional[str] = None, hwid: Optional[str] = None):
+        devices = dict(cfg.get(cfg.knownDevices) or {})
+        entry = dict(devices.get(address, {}))
+        if name is not None:
+            entry["name"] = name
+        if hwid is not None:
+            entry["hwid"] = hwid
+        entry["last_seen"] = int(time.time())
+        devices[address] = entry
+        if len(devices) > self.max_devices:
+            oldest = min(devices, key=lambda a: devices[a].get("last_seen", 0))
+            devices.pop(oldest)
+        cfg.set(cfg.knownDevices, devices)
+
+    def forget(self, address: str):
+        devices = dict(cfg.get(cfg.knownDevices) or {})
+        if devices.pop(address, None) is not None:
+            cfg.set(cfg.knownDevices, devices)
+
+    async def find(self, address: Optional[str] = None, timeout=2.0) -> Optional[BLEDevice]:
+        """
+        Short scan for ``address``, or for the most recently connected known device
+        advertising when no address is given. Returns None on a miss.
+        """
+        if address is not None:
+            return await BleakScanner.find_device_by_address(address, timeout=timeout)
+        rank = {entry["address"]: i for i, entry in enumerate(self.entries())}
+        if not rank:
+            return None
+        found = {}
+        best_found = asyncio.Event()
+
+        def detected(device: BLEDevice, adv):
+            if device.address in rank and (match_nus_uuid(device, adv) or device.name is not None):
+                found[device.address] = device
+                if rank[device.address] == 0:
+                    best_found.set()
+
+        # one scan for every known device, the most recent one ends it early
+        async with BleakScanner(detection_callback=detected):
+            try:
+                await asyncio.wait_for(best_found.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        if not found:
+            return None
+        return min(found.values(), key=lambda device: rank[device.address])
@@ -0,0 +1,86 @@
+# coding:utf-8
+"""
+Automatic reconnection of sessions whose link dropped.
+
+The supervisor retries with exponential backoff using the ``BLEDevice`` already
+known to the session, so no new scan is needed and samples keep going into the
+same session buffer. The gap itself is recorded by ``SessionManager``.
+"""
+import asyncio
+import random
+from typing import Awaitable, Callable, Dict, Optional
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from loguru import logger
+
+from .session_manager import DeviceSession, SessionManager
+
+
+class ReconnectSupervisor(QObject):
+    """ Reconnect lost sessions with exponential backoff """
+
+    reconnecting = pyqtSignal(str, int, float)  # address, attempt, delay
+    reconnected = pyqtSignal(str)
+    gaveUp = pyqtSignal(str)
+
+    def __init__(self, sessions: SessionManager,
+                 on_reconnected: Optional[Callable[[DeviceSession], Awaitable]] = None,
+                 initial_delay=1.0, max_delay=60.0, max_attempts=10, parent=None):
+        super().__init__(parent)
+        self.sessions = sessions
+        self.on_reconnected = on_reconnected
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts  # 0 retries forever
+        self.enabled = True
+        self._tasks = {}  # type: Dict[str, asyncio.Task]
+        sessions.sessionLost.connect(self.schedule)
+
+    def delay(self, attempt: int) -> float:
+        """ backoff before ``attempt`` (0 based), with +-10% jitter """
+        delay = min(self.max_delay, self.initial_delay * 2 ** attempt)
+        return delay * random.uniform(0.9, 1.1)
+
+    def schedule(self, address: str):
+        if not self.enabled or address in self._tasks:
+            return
+        self._tasks[address] = asyncio.ensure_future(self._run(address))
+
+    def pending(self, address: str) -> bool:
+        """ a reconnect of ``address`` is scheduled or running """
+        return address in self._tasks
+
+    def cancel(self, address: str):
+        task = self._tasks.pop(address, None)
+        if task is not None:
+            task.cancel()
+
+    def cancel_all(self):
+        for address in list(self._tasks):
+            self.cancel(address)
+
+    async def _run(self, address: str):
+        try:
+            attempt = 0
+            while self.max_attempts <= 0 or attempt < self.max_attempts:
+                delay = self.delay(attempt)
+                attempt += 1
+                self.reconnecting.emit(address, attempt, delay)
+                await asyncio.sleep(delay)
+
+                session = self.sessions.get(address)
+                if session is None or session.connected:
+                    return
+                try:
+                    await self.sessions.connect(session.device)
+                except Exception as e:
+                    logger.warning("reconnect {} attempt {} failed: {}", address, attempt, e)
+                    continue
+                if self.on_reconnected is not None:
+                    await self.on_reconnected(session)
+                logger.info("reconnected {} after {} attempt(s)", address, attempt)
+                self.reconnected.emit(address)
+                return
+            self.gaveUp.emit(address)
+        finally:
+            self._tasks.pop(address, None)
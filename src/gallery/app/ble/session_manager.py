@@ -0,0 +1,197 @@
+# coding:utf-8
+"""
+Concurrent streaming sessions.
+
+Each connected wearable gets its own ``QBleakClient``, ingest pipeline (and so
+its own parser state) and sample store. All clients share the qasync loop, so
+connects and notifications of different devices are never serialised.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from bleak.backends.device import BLEDevice
+
+from .ble_client import QBleakClient
+from .simulator import SimulatedClient, SimulatedWearable
+from ..common.instrumentation import instrumentation
+from ..stream.pipeline import IngestPipeline
+from ..stream.sample_store import HOT_CAPACITY, TieredSampleStore
+
+
+@dataclass
+class Gap:
+    """ Interval without samples caused by a dropped link, in device epoch seconds """
+
+    start: int  # last sample before the link dropped
+    end: Optional[int] = None  # first sample once streaming resumed
+    generation: int = 0  # pipeline generation of the link that came back
+
+
+@dataclass
+class DeviceSession:
+    """ One wearable and its ingest state """
+
+    device: BLEDevice
+    client: QBleakClient
+    pipeline: IngestPipeline
+    samples: TieredSampleStore
+    hwid: str = "unknown"
+    connected: bool = False
+    closing: bool = False  # disconnect requested by the user
+    gaps: List[Gap] = field(default_factory=list)
+
+    @property
+    def address(self) -> str:
+        return self.device.address
+
+    @property
+    def label(self) -> str:
+        """ hwid once the device sent its info, the address otherwise """
+        return self.hwid if self.hwid != "unknown" else self.address.replace(':', '')
+
+
+class SessionManager(QObject):
+    """ Keeps several ``QBleakClient`` connections alive at the same time """
+
+    controlMessage = pyqtSignal(str, bytearray)
+    batchReady = pyqtSignal(str, int)
+    sessionDisconnected = pyqtSignal(str)
+    sessionLost = pyqtSignal(str)  # disconnected without being asked to
+    sessionsChanged = pyqtSignal()  # a session was added, removed, (dis)connected or renamed
+
+    def __init__(self, batch_window=0.05, batch_size=32, capacity=HOT_CAPACITY, delimited=False, parent=None):
+        super().__init__(parent)
+        self.delimited = delimited  # firmware terminates its frames, see ``FrameReassembler``
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self.capacity = capacity
+        self.sessions = {}  # type: Dict[str, DeviceSession]
+
+    def __iter__(self):
+        return iter(list(self.sessions.values()))
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def get(self, address: str) -> Optional[DeviceSession]:
+        return self.sessions.get(address)
+
+    def _new_client(self, device: BLEDevice) -> QBleakClient:
+        client_class = SimulatedClient if isinstance(device.details, SimulatedWearable) else QBleakClient
+        client = client_class(device, batch_window=self.batch_window, batch_size=self.batch_size)
+        address = device.address
+        client.messageDiconnect.connect(lambda _: self._handle_disconnect(address))
+        return client
+
+    async def connect(self, device: BLEDevice) -> DeviceSession:
+        """ connect a device, a known device keeps its buffer and parser state """
+        session = self.sessions.get(device.address)
+        if session is not None and session.connected:
+            return session
+
+        created = session is None
+        if created:
+            delimited = self.delimited
+            if isinstance(device.details, SimulatedWearable):
+                delimited = bool(device.details.delimiter)
+            pipeline = IngestPipeline(source=device.address, delimited=delimited, parent=self)
+            pipeline.controlMessage.connect(self._handle_control)
+            pipeline.batchReady.connect(self.batchReady)
+            pipeline.start()
+            session = DeviceSession(device, None, pipeline, TieredSampleStore(self.capacity))
+            self.sessions[device.address] = session
+
+        session.device = device
+        session.closing = False
+        session.client = self._new_client(device)
+        session.client.messageChanged.connect(session.pipeline.submit)
+        session.client.messagesBatched.connect(session.pipeline.submit_many)
+        try:
+            await session.client.start()
+        except Exception:
+            if created:
+                # a device that never streamed leaves nothing behind
+                self.sessions.pop(device.address, None)
+                session.pipeline.stop()
+                session.samples.close()
+            raise
+        session.connected = True
+        self.sessionsChanged.emit()
+        return session
+
+    async def connect_all(self, devices: Iterable[BLEDevice]) -> List:
+        """ connect devices concurrently, failed connects are returned as exceptions """
+        return await asyncio.gather(*(self.connect(d) for d in devices), return_exceptions=True)
+
+    async def disconnect(self, address: str):
+        session = self.sessions.get(address)
+        if session is None or session.client is None:
+            return
+        session.closing = True
+        session.connected = False
+        await session.client.stop()
+
+    async def disconnect_all(self):
+        await asyncio.gather(*(self.disconnect(address) for address in list(self.sessions)))
+
+    async def remove(self, address: str):
+        """ disconnect a device and drop its buffered samples """
+        await self.disconnect(address)
+        session = self.sessions.pop(address, None)
+        if session is not None:
+            session.pipeline.stop()
+            session.samples.close()
+            self.sessionsChanged.emit()
+
+    def drain(self):
+        """ move the parsed batches of every session into its buffer, GUI thread only """
+        for session in self.sessions.values():
+            for batch in session.pipeline.drain():
+                if session.gaps and session.gaps[-1].end is None and len(batch):
+                    self._update_gaps(session, batch)
+                with instrumentation.timer("append", len(batch)):
+                    session.samples.extend(batch)
+
+    @staticmethod
+    def _update_gaps(session: DeviceSession, batch):
+        """ close the open gaps with the first sample of a later link """
+        closed = []
+        for gap in reversed(session.gaps):
+            if gap.end is not None:
+                break  # open gaps are the most recent ones
+            if batch.generation >= gap.generation:
+                gap.end = int(batch.timestamp[0])
+                closed.append(gap)
+            else:
+                # received before the drop, processed after the gap was opened
+                gap.start = max(gap.start, int(batch.timestamp[-1]))
+        # a link that dropped again before sending anything leaves one gap
+        for gap in closed[:-1]:
+            session.gaps.remove(gap)
+
+    def _handle_control(self, address: str, message: bytearray):
+        session = self.sessions.get(address)
+        if session is not None and message.startswith(b"info"):
+            session.hwid = bytes(message[4:]).decode(errors='replace').split(' ')[0]
+            self.sessionsChanged.emit()
+        self.controlMessage.emit(address, message)
+
+    def _handle_disconnect(self, address: str):
+        session = self.sessions.get(address)
+        if session is None:
+            return
+        session.connected = False
+        # the client flushed its last notifications, anything submitted from now on is from the next link
+        session.pipeline.generation += 1
+        if session.closing:
+            session.closing = False
+        else:
+            last = session.samples.last()
+            session.gaps.append(Gap(last[0] if last is not None else int(time.time()),
+                                    generation=session.pipeline.generation))
+            self.sessionLost.emit(address)
+        self.sessionDisconnected.emit(address)
+        self.sessionsChanged.emit()
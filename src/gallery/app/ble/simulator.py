@@ -0,0 +1,154 @@
+# coding:utf-8
+"""
+In-process simulated wearable for load testing without a Bluetooth adapter.
+
+``SimulatedWearable`` speaks the firmware UART protocol: it answers ``info`` on
+connect, ``batt_level`` with a ``batt_`` message, accepts the ``flip_``, ``led_``,
+``actcount_``, clock and accelerometer setting commands and streams
+``YYMMDDhhmmss,x,y,z[,count]`` frames at its sampling rate. ``SimulatedClient``
+is a ``QBleakClient`` whose notifications come from such a wearable, so batching,
+instrumentation and everything downstream run unchanged. A simulated device is a
+``BLEDevice`` whose ``details`` is the wearable, ``SessionManager`` picks the
+client from that.
+
+Set ``WEARABLE_SIMULATOR=N`` or ``N@RATE`` (e.g. ``8@100``) to list N simulated
+devices in the scan view.
+"""
+import asyncio
+import math
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List
+
+from bleak.backends.device import BLEDevice
+
+from .ble_client import QBleakClient
+
+
+@dataclass
+class SimulatedWearable:
+    """ Protocol state of one simulated device """
+
+    hwid: str = "SIM0000"
+    sampling: int = 25
+    jitter: float = 0.1  # relative jitter of the notification timing
+    sensitivity: str = "1.2"
+    count_enabled: bool = False
+    flip_count: int = 1
+    battery: int = 87
+    msd_size: int = 32000000
+    msd_free: int = 31000000
+    delimiter: bytes = b''  # b'\n' to terminate frames like newer firmware
+    notify_size: int = 0  # split terminated frames to this ATT payload size, 0 keeps whole frames
+    led: bool = False
+    clock_offset: float = 0.0
+    _phase: float = field(default_factory=random.random)
+    _count: int = 0
+
+    def info(self) -> str:
+        return (f"info{self.hwid} {self.sensitivity} {self.sampling} {int(self.count_enabled)} "
+                f"{self.flip_count} {self.msd_size} {self.msd_free} {self.battery}")
+
+    def handle_command(self, command: str) -> List[str]:
+        """ apply a command written to the RX characteristic, returns the replies """
+        if command == "batt_level":
+            return [f"batt_{self.battery}:{3600 + self.battery * 6}:25"]
+        if command.startswith("flip_"):
+            self.flip_count = int(command[5:])
+        elif command.startswith("led_"):
+            self.led = command == "led_on"
+        elif command.startswith("actcount_"):
+            self.count_enabled = command == "actcount_on"
+        else:
+            parts = command.split(' ')
+            if len(parts) == 6 and all(p.isdigit() for p in parts):
+                # "yy mm dd HH MM SS" clock update
+                device_now = datetime.strptime(command, "%y %m %d %H %M %S")
+                self.clock_offset = device_now.timestamp() - time.time()
+            elif len(parts) == 4 and all(p.isdigit() for p in parts):
+                # "rate sens_int sens_frac 0" accelerometer settings
+                self.sampling = int(parts[0])
+                self.sensitivity = f"{parts[1]}.{parts[2]}" if parts[2] != "0" else parts[1]
+        return []
+
+    def frame(self, t: float) -> str:
+        """ one data frame for wall clock time ``t`` """
+        stamp = datetime.fromtimestamp(t + self.clock_offset).strftime("%y%m%d%H%M%S")
+        w = 2 * math.pi * (0.5 + self._phase)
+        x = math.sin(w * t) + random.gauss(0, 0.05)
+        y = math.cos(w * t) + random.gauss(0, 0.05)
+        z = 1.0 + random.gauss(0, 0.05)
+        if not self.count_enabled:
+            return f"{stamp},{x:.3f},{y:.3f},{z:.3f}"
+        self._count += int(math.sqrt(x * x + y * y + z * z) > 1.2)
+        return f"{stamp},{x:.3f},{y:.3f},{z:.3f},{self._count}"
+
+    def notifications(self, message: str) -> List[bytes]:
+        """ payloads carrying ``message`` on the TX characteristic """
+        payload = message.encode() + self.delimiter
+        if not self.delimiter or self.notify_size <= 0:
+            return [payload]
+        return [payload[i:i + self.notify_size] for i in range(0, len(payload), self.notify_size)]
+
+
+class SimulatedClient(QBleakClient):
+    """ ``QBleakClient`` fed by a ``SimulatedWearable`` instead of a BleakClient """
+
+    def __post_init__(self):
+        super().__post_init__()
+        self.wearable = self.device.details  # type: SimulatedWearable
+        self._task = None
+
+    async def start(self):
+        print(f"Starting simulated client {self.device.name}")
+        self._notify(self.wearable.info())
+        self._task = asyncio.ensure_future(self._stream())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            self._handle_disconnect(self.device)
+        self.flush()
+
+    async def write(self, data, response=None):
+        for reply in self.wearable.handle_command(bytes(data).decode()):
+            self._notify(reply)
+
+    def _notify(self, message: str):
+        for payload in self.wearable.notifications(message):
+            self._handle_read(0, bytearray(payload))
+
+    async def _stream(self):
+        tick = 0.01
+        due = time.time()
+        while True:
+            w = self.wearable
+            interval = 1 / max(w.sampling, 1)
+            await asyncio.sleep(tick)
+            now = time.time()
+            while due <= now:
+                self._notify(w.frame(due))
+                due += interval * random.uniform(1 - w.jitter, 1 + w.jitter)
+
+
+def simulated_devices(n, sampling=25, jitter=0.1, **kwargs) -> List[BLEDevice]:
+    """ ``n`` simulated devices that can be passed to ``SessionManager.connect`` """
+    devices = []
+    for i in range(n):
+        wearable = SimulatedWearable(hwid=f"SIM{i:04d}", sampling=sampling, jitter=jitter, **kwargs)
+        address = f"00:00:00:00:{i // 256:02X}:{i % 256:02X}"
+        devices.append(BLEDevice(address, f"SimAcc{i}", wearable, -40))
+    return devices
+
+
+def devices_from_env(variable="WEARABLE_SIMULATOR") -> List[BLEDevice]:
+    """ simulated devices requested by ``N`` or ``N@RATE`` in the environment """
+    value = os.environ.get(variable, "")
+    if not value:
+        return []
+    n, _, rate = value.partition('@')
+    return simulated_devices(int(n), sampling=int(rate) if rate else 25)
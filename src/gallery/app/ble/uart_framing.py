@@ -0,0 +1,88 @@
+# coding:utf-8
+"""
+Reassembly of the frames received on the Nordic UART TX characteristic.
+
+A notification carries at most one ATT payload (``UART_SAFE_SIZE`` bytes on a
+default MTU), so a frame can be split over several notifications and several
+short frames can share one. Bytes are buffered and split on the delimiter,
+scanning through ``memoryview`` slices so each frame is copied out exactly once.
+
+Whether the firmware terminates its frames is not something a fragment can
+tell, so it is set explicitly: without ``delimited`` every notification is one
+frame. With it, a stream that lost sync drops its bytes up to the next delimiter
+instead of emitting the tail of a frame.
+"""
+from typing import List, Union
+
+
+class FrameReassembler:
+    """ Split a byte stream into delimiter terminated frames, in arrival order """
+
+    def __init__(self, delimiter=b'\n', max_frame_size=512, delimited=False):
+        self.delimiter = delimiter
+        self.max_frame_size = max_frame_size
+        self.delimited = delimited
+        self.frames = 0
+        self.dropped_bytes = 0
+        self._buffer = bytearray()
+        self._synced = True  # the buffer starts at a frame, false until the next delimiter after a loss
+
+    @property
+    def pending(self) -> int:
+        """ number of buffered bytes of an incomplete frame """
+        return len(self._buffer)
+
+    def reset(self):
+        self._buffer.clear()
+        self._synced = True
+
+    def feed(self, data: Union[bytes, bytearray]) -> List[bytes]:
+        """ add a notification, returns the frames it completed """
+        if not self.delimited:
+            # firmware that does not terminate its frames sends one frame per notification
+            self.frames += 1
+            return [bytes(data)]
+        if not self._synced:
+            start = data.find(self.delimiter)
+            if start < 0:
+                self.dropped_bytes += len(data)
+                return []
+            self.dropped_bytes += start
+            data = data[start + len(self.delimiter):]
+            self._synced = True
+
+        if self._buffer:
+            self._buffer += data
+            source = self._buffer
+        else:
+            source = data
+
+        frames = []
+        start = 0
+        step = len(self.delimiter)
+        view = memoryview(source)
+        try:
+            while True:
+                end = source.find(self.delimiter, start)
+                if end < 0:
+                    break
+                stop = end - 1 if end > start and source[end - 1] == 13 else end  # tolerate \r\n
+                if stop > start:
+                    frames.append(view[start:stop].tobytes())
+                start = end + step
+            tail = view[start:].tobytes() if source is not self._buffer else None
+        finally:
+            view.release()
+
+        if source is self._buffer:
+            del self._buffer[:start]
+        else:
+            self._buffer[:] = tail
+
+        if len(self._buffer) > self.max_frame_size:
+            # no delimiter for too long, the stream is out of sync
+            self.dropped_bytes += len(self._buffer)
+            self._buffer.clear()
+            self._synced = False
+        self.frames += len(frames)
+        return frames
@@ -22,6 +22,8 @@ UART_SERVICE_UUID = "6E400001-B5A3-F393-E0A9-E50E24DCCA9E"
 UART_RX_CHAR_UUID = "6E400002-B5A3-F393-E0A9-E50E24DCCA9E"
 UART_TX_CHAR_UUID = "6E400003-B5A3-F393-E0A9-E50E24DCCA9E"
 
+UART_SAFE_SIZE = 20  # ATT payload of the default 23 byte MTU
+
 
 # TIP: you can get this function and more from the ``more-itertools`` package.
 def sliced(data: bytes, n: int) -> Iterator[bytes]:
@@ -32,21 +34,22 @@ def sliced(data: bytes, n: int) -> Iterator[bytes]:
     return takewhile(len, (data[i : i + n] for i in count(0, n)))
 
 
+def match_nus_uuid(device: BLEDevice, adv: AdvertisementData):
+    # This assumes that the device includes the UART service UUID in the
+    # advertising data. This test may need to be adjusted depending on the
+    # actual advertising data supplied by the device.
+    if UART_SERVICE_UUID.lower() in adv.service_uuids:
+        return True
+
+    return False
+
+
 async def uart_terminal():
     """This is a simple "terminal" program that uses the Nordic Semiconductor
     (nRF) UART service. It reads from stdin and sends each line of data to the
     remote device. Any data received from the device is printed to stdout.
     """
 
-    def match_nus_uuid(device: BLEDevice, adv: AdvertisementData):
-        # This assumes that the device includes the UART service UUID in the
-        # advertising data. This test may need to be adjusted depending on the
-        # actual advertising data supplied by the device.
-        if UART_SERVICE_UUID.lower() in adv.service_uuids:
-            return True
-
-        return False
-
     device = await BleakScanner.find_device_by_filter(match_nus_uuid)
 
     if device is None:
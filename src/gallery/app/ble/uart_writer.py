@@ -0,0 +1,79 @@
+# coding:utf-8
+"""
+Chunked writes to the Nordic UART RX characteristic.
+
+Payloads are sliced to the negotiated ``max_write_without_response_size`` and,
+for large transfers, written back to back without response. Every
+``ack_every``-th chunk and the last one are written with response, so the
+peripheral can apply back pressure and a finished write has been delivered.
+Writes are serialised in FIFO order by a lock, so commands never interleave
+with the chunks of a transfer.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+
+from bleak import BleakClient
+
+from .uart_service import UART_RX_CHAR_UUID, UART_SAFE_SIZE, sliced
+
+
+@dataclass
+class WriteStats:
+    """ Counters of one transfer or of the whole queue """
+
+    bytes: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """ bytes per second """
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+
+class UartWriteQueue:
+    """ FIFO of chunked writes on one BleakClient """
+
+    def __init__(self, client: BleakClient, char_uuid=UART_RX_CHAR_UUID, ack_every=16):
+        self.client = client
+        self.char_uuid = char_uuid
+        self.ack_every = ack_every
+        self.total = WriteStats()
+        self.last = WriteStats()
+        self._lock = asyncio.Lock()
+
+    @property
+    def chunk_size(self) -> int:
+        """ largest payload of a single write, ``UART_SAFE_SIZE`` until services are resolved """
+        try:
+            char = self.client.services.get_characteristic(self.char_uuid)
+        except Exception:
+            char = None
+        if char is None:
+            return UART_SAFE_SIZE
+        return max(UART_SAFE_SIZE, char.max_write_without_response_size)
+
+    async def write(self, data: bytes, response=None) -> WriteStats:
+        """
+        Write ``data`` in chunks. ``response=None`` keeps acknowledged writes for
+        payloads that fit in one chunk and pipelines larger ones.
+        """
+        async with self._lock:
+            size = self.chunk_size
+            if response is None:
+                response = len(data) <= size
+            stats = WriteStats()
+            start = time.perf_counter()
+            chunks = list(sliced(data, size))
+            for i, chunk in enumerate(chunks, 1):
+                ack = response or i == len(chunks) or (self.ack_every > 0 and i % self.ack_every == 0)
+                await self.client.write_gatt_char(self.char_uuid, chunk, response=ack)
+                stats.bytes += len(chunk)
+                stats.chunks += 1
+            stats.seconds = time.perf_counter() - start
+            self.last = stats
+            self.total.bytes += stats.bytes
+            self.total.chunks += stats.chunks
+            self.total.seconds += stats.seconds
+            return stats
@@ -56,6 +56,15 @@ class Config(QConfig):
     # software update
     checkUpdateAtStartUp = ConfigItem("Update", "CheckUpdateAtStartUp", True, BoolValidator())
 
+    # bluetooth
+    knownDevices = ConfigItem("Bluetooth", "KnownDevices", {})
+    delimitedFrames = ConfigItem("Bluetooth", "DelimitedFrames", False, BoolValidator())
+    reconnectAttempts = RangeConfigItem("Bluetooth", "ReconnectAttempts", 10, RangeValidator(0, 100))  # 0 retries forever
+
+    # streaming
+    maxFps = RangeConfigItem("Streaming", "MaxFps", 20, RangeValidator(1, 60))
+    robustAutoscale = ConfigItem("Streaming", "RobustAutoscale", False, BoolValidator())
+
 
 YEAR = 2020
 AUTHOR = ""
@@ -0,0 +1,112 @@
+# coding:utf-8
+"""
+Counters and timers for the streaming hot path.
+
+Each stage (notify, decode, parse, append, render) keeps a count and timing
+totals that can be read with ``snapshot()``. Hot path logging goes through
+``log_sampled`` which emits at most one loguru record per stage and interval.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from loguru import logger
+
+STAGES = ("notify", "decode", "parse", "append", "render")
+
+
+class StageStats:
+    """ Running totals of one stage """
+
+    __slots__ = ("count", "calls", "seconds", "max_seconds")
+
+    def __init__(self):
+        self.count = 0        # items (notifications, frames, samples...)
+        self.calls = 0        # timed calls
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+
+class Instrumentation:
+    """ Per stage counters, timers and rate limited logging """
+
+    def __init__(self, log_interval=5.0, summary_interval=60.0):
+        self.log_interval = log_interval
+        self.summary_interval = summary_interval
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stages = {stage: StageStats() for stage in STAGES}
+            self._started = time.perf_counter()
+            self._last_log = {}
+            self._suppressed = {}
+            self._last_summary = self._started
+
+    def _stage(self, stage) -> StageStats:
+        stats = self._stages.get(stage)
+        if stats is None:
+            stats = self._stages[stage] = StageStats()
+        return stats
+
+    def count(self, stage, n=1):
+        with self._lock:
+            self._stage(stage).count += n
+
+    def record(self, stage, seconds, n=1):
+        with self._lock:
+            stats = self._stage(stage)
+            stats.count += n
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+
+    @contextmanager
+    def timer(self, stage, n=1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start, n)
+
+    def snapshot(self) -> dict:
+        """ ``{stage: {count, rate, mean_ms, max_ms}}``, rate is per second since the last reset """
+        with self._lock:
+            elapsed = max(time.perf_counter() - self._started, 1e-9)
+            return {
+                stage: {
+                    "count": s.count,
+                    "rate": s.count / elapsed,
+                    "mean_ms": s.seconds / s.calls * 1e3 if s.calls else 0.0,
+                    "max_ms": s.max_seconds * 1e3,
+                }
+                for stage, s in self._stages.items()
+            }
+
+    def log_sampled(self, stage, message, *args, level="DEBUG"):
+        """ log at most once per ``log_interval`` and stage, skipped records are counted """
+        now = time.perf_counter()
+        with self._lock:
+            if now - self._last_log.get(stage, -self.log_interval) < self.log_interval:
+                self._suppressed[stage] = self._suppressed.get(stage, 0) + 1
+                return
+            self._last_log[stage] = now
+            suppressed = self._suppressed.pop(stage, 0)
+        if suppressed:
+            message = f"{message} (+{suppressed} suppressed)"
+        logger.opt(depth=1).log(level, f"[{stage}] {message}", *args)
+
+    def log_summary(self, force=False):
+        """ log the snapshot every ``summary_interval`` seconds """
+        now = time.perf_counter()
+        if not force and now - self._last_summary < self.summary_interval:
+            return
+        self._last_summary = now
+        for stage, s in self.snapshot().items():
+            if s["count"]:
+                logger.info("{}: {} ({:.1f}/s) mean {:.3f}ms max {:.3f}ms",
+                            stage, s["count"], s["rate"], s["mean_ms"], s["max_ms"])
+
+
+instrumentation = Instrumentation()
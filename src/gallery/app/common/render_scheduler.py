@@ -0,0 +1,53 @@
+# coding:utf-8
+"""
+Redraw scheduling independent of the device sampling rate.
+
+Producers call ``request()`` whenever something changed, the scheduler marks the
+view dirty and runs the render callback once, no sooner than ``1 / max_fps``
+after the previous redraw. Requests arriving in between are coalesced into that
+single redraw and nothing runs while no request comes in.
+"""
+import time
+from typing import Callable
+
+from PyQt5.QtCore import QObject, QTimer
+
+
+class RenderScheduler(QObject):
+    """ Dirty flag plus frame rate cap around a render callback """
+
+    def __init__(self, render: Callable[[], None], max_fps=20, parent=None):
+        super().__init__(parent)
+        self.render = render
+        self.max_fps = max_fps
+        self.dirty = False
+        self.enabled = True
+        self.frames = 0
+        self._last_frame = 0.0
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._frame)
+
+    def set_max_fps(self, fps):
+        self.max_fps = max(1, fps)
+
+    def request(self):
+        """ mark dirty and schedule a redraw if none is pending """
+        self.dirty = True
+        if not self.enabled or self._timer.isActive():
+            return
+        wait = self._last_frame + 1 / self.max_fps - time.perf_counter()
+        self._timer.start(max(0, int(wait * 1000)))
+
+    def flush(self):
+        """ redraw now if dirty, regardless of the frame rate cap """
+        self._timer.stop()
+        self._frame()
+
+    def _frame(self):
+        if not self.dirty or not self.enabled:
+            return
+        self.dirty = False
+        self._last_frame = time.perf_counter()
+        self.frames += 1
+        self.render()
@@ -0,0 +1,88 @@
+# coding:utf-8
+"""
+Scrolling activity count bars drawn by persistent plot items.
+
+The counts of the visible window are kept in a ``TraceBuffer`` and pushed to the
+same items on every update, nothing is added to or removed from the scene. Up to
+``step_threshold`` bars are drawn by a ``BarGraphItem``; denser windows switch to
+one filled step curve, a single path whose cost does not depend on painting
+thousands of rectangles. The step curve also draws summaries of older history.
+Bars are ``width`` of their ``spacing``, the number of samples one count covers.
+"""
+import numpy as np
+import pyqtgraph as pg
+
+from ..common.instrumentation import instrumentation
+from ..stream.trace import TraceBuffer
+
+
+class ActivityBars:
+    """ Last ``window`` activity counts of a plot """
+
+    def __init__(self, plot: pg.PlotItem, window, brush='#64B4BE', width=0.6, step_threshold=600):
+        self.width = width
+        self.spacing = 1.0  # samples per count
+        self.step_threshold = step_threshold
+        self.trace = TraceBuffer(window, channels=1)
+        self._edges = np.empty(window + 1)
+        self.bars = pg.BarGraphItem(x=[], height=[], width=width, brush=brush)
+        self.step = pg.PlotDataItem(stepMode="center", fillLevel=0, brush=brush, pen=pg.mkPen(brush))
+        self.step.setVisible(False)
+        plot.addItem(self.bars)
+        plot.addItem(self.step)
+
+    def __len__(self):
+        return len(self.trace)
+
+    def heights(self) -> np.ndarray:
+        return self.trace.y(0)
+
+    def append(self, count):
+        self.trace.append(count)
+
+    def extend(self, counts, x=None):
+        """ add counts at positions ``x``, consecutive positions by default """
+        if len(counts):
+            self.trace.extend(np.asarray(counts, dtype=float)[np.newaxis],
+                              None if x is None else np.asarray(x, dtype=float))
+
+    def clear(self):
+        self.trace.clear()
+        self.update()
+
+    def set_spacing(self, spacing):
+        """ samples covered by one count, 1 for device counts and the epoch length for computed ones """
+        if spacing != self.spacing:
+            self.spacing = float(spacing)
+            self.bars.setOpts(width=self.width * self.spacing)
+
+    def show_history(self, x: np.ndarray, heights: np.ndarray):
+        """ draw summary entries starting at ``x`` instead of the live window """
+        with instrumentation.timer("activity"):
+            if len(x) == 0:
+                self.step.setData([], [])
+            else:
+                last = x[-1] - x[-2] if len(x) > 1 else 1.0
+                self.step.setData(np.append(x, x[-1] + last), heights)
+            self.bars.setVisible(False)
+            self.step.setVisible(True)
+
+    def update(self):
+        """ push the window to the plot items, O(window) """
+        with instrumentation.timer("activity"):
+            x, heights = self.trace.x(), self.trace.y(0)
+            n = len(x)
+            if n > self.step_threshold:
+                # bar edges halfway between the counts, the last one closes the final bar
+                edges = self._edges[:n + 1]
+                np.subtract(x, 0.5 * self.spacing, out=edges[:n])
+                edges[n] = x[-1] + 0.5 * self.spacing
+                self.step.setData(edges, heights)
+                if self.bars.isVisible():
+                    self.bars.setVisible(False)
+                    self.step.setVisible(True)
+            else:
+                self.bars.setOpts(x=x, height=heights)
+                if not self.bars.isVisible():
+                    self.step.setVisible(False)
+                    self.bars.setVisible(True)
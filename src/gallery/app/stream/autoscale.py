@@ -0,0 +1,71 @@
+# coding:utf-8
+"""
+Y range of the live curves from running extrema.
+
+Two monotonic deques hold the candidates for the minimum and maximum of the last
+``window`` samples: a sample enters once and leaves once, so keeping the range
+current costs O(1) amortised per sample instead of a rescan of every visible
+point on each redraw.
+
+In robust mode the samples go through a 3 point median first, which removes any
+single sample spike before it can stretch the axis, at the price of one sample
+of delay.
+"""
+from collections import deque
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class RunningExtrema:
+    """ Min and max over all channels of the last ``window`` samples """
+
+    def __init__(self, window, robust=False):
+        self.window = window
+        self.robust = robust
+        self._lo = deque()  # (seq, value), values increasing
+        self._hi = deque()  # (seq, value), values decreasing
+        self._tail_seq = np.empty(0)
+        self._tail = None  # last two raw samples, for the median
+
+    def clear(self):
+        self._lo.clear()
+        self._hi.clear()
+        self._tail_seq = np.empty(0)
+        self._tail = None
+
+    def extend(self, seq: np.ndarray, values: np.ndarray):
+        """ add samples numbered ``seq``, ``values`` has shape ``(channels, len(seq))`` """
+        if self.robust:
+            seq, values = self._median3(seq, values)
+        if not len(seq):
+            return
+        for s, v in zip(seq.tolist(), values.min(axis=0).tolist()):
+            while self._lo and self._lo[-1][1] >= v:
+                self._lo.pop()
+            self._lo.append((s, v))
+        for s, v in zip(seq.tolist(), values.max(axis=0).tolist()):
+            while self._hi and self._hi[-1][1] <= v:
+                self._hi.pop()
+            self._hi.append((s, v))
+        first = seq[-1] - self.window + 1
+        while self._lo[0][0] < first:
+            self._lo.popleft()
+        while self._hi[0][0] < first:
+            self._hi.popleft()
+
+    def _median3(self, seq, values):
+        if self._tail is not None:
+            seq = np.concatenate((self._tail_seq, seq))
+            values = np.concatenate((self._tail, values), axis=1)
+        self._tail_seq, self._tail = seq[-2:], values[:, -2:]
+        if len(seq) < 3:
+            return np.empty(0), values[:, :0]
+        median = np.median(np.stack((values[:, :-2], values[:, 1:-1], values[:, 2:])), axis=0)
+        return seq[1:-1], median
+
+    def range(self) -> Optional[Tuple[float, float]]:
+        """ ``(min, max)`` of the window, None before the first sample """
+        if not self._lo:
+            return None
+        return self._lo[0][1], self._hi[0][1]
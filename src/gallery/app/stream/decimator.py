@@ -0,0 +1,96 @@
+# coding:utf-8
+"""
+Peak preserving level of detail for the live curves.
+
+The window of a trace is cut into buckets of consecutive points, one bucket per
+pixel column of the plot, and every bucket is drawn as its minimum and maximum in
+the order they occurred. Spikes therefore survive whatever the zoom, and the
+curves hold about two points per column instead of the whole window.
+
+Buckets are reduced once, when they are complete, and kept in a ``TraceBuffer``.
+Only the points of the bucket being filled are carried over to the next call, so
+adding points costs O(new points) and a redraw O(columns).
+"""
+import numpy as np
+
+from .trace import TraceBuffer
+
+
+class MinMaxDecimator:
+    """ Min/max buckets over the last ``window`` points of ``channels`` curves """
+
+    def __init__(self, window, columns=1000, channels=3):
+        self.window = window
+        self.channels = channels
+        self.resize(columns)
+
+    def resize(self, columns):
+        """ bucket size for ``columns`` pixel columns, clears the buckets """
+        self.columns = max(1, int(columns))
+        bucket = -(-self.window // self.columns)
+        # two points per bucket only pay off from three points up
+        self.bucket = bucket if bucket > 2 else 1
+        points = self.window if self.bucket == 1 else 2 * (self.window // self.bucket)
+        self.buckets = TraceBuffer(max(points, 1), self.channels)
+        self._pending_x = np.empty(self.bucket)
+        self._pending = np.empty((self.channels, self.bucket))
+        self._n_pending = 0
+
+    def clear(self):
+        self.buckets.clear()
+        self._n_pending = 0
+
+    def rebuild(self, x: np.ndarray, values: np.ndarray):
+        """ start over from the points of a whole window, e.g. after ``resize`` """
+        self.clear()
+        self.extend(x, values)
+
+    def extend(self, x: np.ndarray, values: np.ndarray):
+        """ add points, ``values`` has shape ``(channels, len(x))`` """
+        n = len(x)
+        i = 0
+        if self._n_pending:
+            i = min(self.bucket - self._n_pending, n)
+            self._pending_x[self._n_pending:self._n_pending + i] = x[:i]
+            self._pending[:, self._n_pending:self._n_pending + i] = values[:, :i]
+            self._n_pending += i
+            if self._n_pending < self.bucket:
+                return
+            self._reduce(self._pending_x, self._pending)
+            self._n_pending = 0
+        complete = (n - i) // self.bucket * self.bucket
+        if complete:
+            self._reduce(x[i:i + complete], values[:, i:i + complete])
+            i += complete
+        rest = n - i
+        self._pending_x[:rest] = x[i:]
+        self._pending[:, :rest] = values[:, i:]
+        self._n_pending = rest
+
+    def _reduce(self, x: np.ndarray, values: np.ndarray):
+        if self.bucket == 1:
+            self.buckets.extend(values, x)
+            return
+        k = len(x) // self.bucket
+        v = values.reshape(self.channels, k, self.bucket)
+        i_min = v.argmin(axis=2)[..., np.newaxis]
+        i_max = v.argmax(axis=2)[..., np.newaxis]
+        lo = np.take_along_axis(v, i_min, axis=2)[..., 0]
+        hi = np.take_along_axis(v, i_max, axis=2)[..., 0]
+        min_first = (i_min <= i_max)[..., 0]
+        points = np.empty((self.channels, 2 * k))
+        points[:, 0::2] = np.where(min_first, lo, hi)
+        points[:, 1::2] = np.where(min_first, hi, lo)
+        self.buckets.extend(points, np.repeat(x[::self.bucket], 2))
+
+    def x(self) -> np.ndarray:
+        """ x coordinates of the decimated window, oldest first """
+        if not self._n_pending:
+            return self.buckets.x()
+        return np.concatenate((self.buckets.x(), self._pending_x[:self._n_pending]))
+
+    def y(self, channel=0) -> np.ndarray:
+        """ decimated values of ``channel``, the points of the open bucket as they are """
+        if not self._n_pending:
+            return self.buckets.y(channel)
+        return np.concatenate((self.buckets.y(channel), self._pending[channel, :self._n_pending]))
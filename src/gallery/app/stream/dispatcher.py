@@ -0,0 +1,62 @@
+# coding:utf-8
+"""
+Table driven routing of the frames received from the wearable.
+
+Data frames are recognised first with a fixed position check, every other frame
+is looked up by prefix in a table (one dict lookup per registered prefix
+length), so adding a message type never lengthens the data path. Each
+handler call is recorded as a stage of ``instrumentation``, so handler timings
+appear in its snapshot and periodic summary next to the pipeline stages.
+"""
+import time
+from typing import Callable, Dict
+
+from ..common.instrumentation import instrumentation
+from .parser import is_data_frame
+
+DATA = "data"
+UNKNOWN = "unknown"
+
+
+class MessageDispatcher:
+    """ Route frames to the handler registered for their prefix """
+
+    def __init__(self, stage="dispatch"):
+        self.stage = stage  # handlers are timed as ``<stage>.<name>`` in ``instrumentation``
+        self._prefixes = {}  # type: Dict[bytes, str]
+        self._lengths = []
+        self._handlers = {DATA: None, UNKNOWN: None}  # type: Dict[str, Callable]
+        self._stages = {}  # type: Dict[str, str]
+
+    def register(self, name: str, handler: Callable[[bytes], None], prefix: bytes = None):
+        """ register ``handler`` under ``name``, matched by ``prefix`` unless name is data/unknown """
+        self._handlers[name] = handler
+        self._stages[name] = f"{self.stage}.{name}"
+        if prefix is not None:
+            self._prefixes[prefix] = name
+            self._lengths = sorted({len(p) for p in self._prefixes}, reverse=True)
+
+    def classify(self, frame: bytes) -> str:
+        if is_data_frame(frame):
+            return DATA
+        for length in self._lengths:
+            name = self._prefixes.get(frame[:length])
+            if name is not None:
+                return name
+        return UNKNOWN
+
+    def dispatch(self, frame: bytes) -> str:
+        """ call the handler of ``frame``, returns the message type """
+        name = self.classify(frame)
+        handler = self._handlers.get(name)
+        if handler is None:
+            return name
+        start = time.perf_counter()
+        handler(frame)
+        instrumentation.record(self._stages[name], time.perf_counter() - start)
+        return name
+
+    def snapshot(self) -> dict:
+        """ the ``instrumentation`` snapshot of the registered handlers, by handler name """
+        stages = instrumentation.snapshot()
+        return {name: stages[stage] for name, stage in self._stages.items() if stage in stages}
@@ -0,0 +1,205 @@
+# coding:utf-8
+"""
+Batch parser for the data frames streamed by the wearable.
+
+A data frame is ``YYMMDDhhmmss,x,y,z[,count]``, or ``YYMMDDhhmmss,count`` when the
+device only outputs activity counts. Instead of ``strptime`` and ``float()`` per
+notification, a whole batch of payloads is split once and each field is converted
+column-wise with NumPy. Live batches of a few frames take a row by row path
+instead, where the fixed cost of the column-wise conversion would dominate.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional, Union
+
+import numpy as np
+
+from .timestamp import TIMESTAMP_LEN, TimestampDecoder
+
+NO_COUNT = -1  # activity_count value of frames that do not carry a count
+SMALL_BATCH = 64  # batches shorter than this are parsed row by row
+_COUNT_LIMIT = 2.0 ** 63  # counts must fit an int64, non finite ones never do
+
+_COMMA = ord(',')
+_decoder = TimestampDecoder()
+
+
+@dataclass
+class FrameBatch:
+    """ Parsed data frames, one NumPy column per field """
+
+    timestamp: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    z: np.ndarray
+    activity_count: np.ndarray
+    rejected: int = 0
+    generation: int = 0  # link the frames were received on, see ``IngestPipeline.generation``
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def to_rows(self) -> List[list]:
+        """ rows in the ``[timestamp, x, y, z, activity_count]`` layout of the former per message parser """
+        counts = [None if c == NO_COUNT else c for c in self.activity_count.tolist()]
+        return [list(row) for row in zip(
+            self.timestamp.tolist(), self.x.tolist(), self.y.tolist(), self.z.tolist(), counts)]
+
+    @classmethod
+    def empty(cls, rejected=0):
+        return cls(np.empty(0, np.int64), np.empty(0), np.empty(0), np.empty(0),
+                   np.empty(0, np.int64), rejected)
+
+    @classmethod
+    def concatenate(cls, batches: List['FrameBatch']) -> 'FrameBatch':
+        """ merge batches of the same generation """
+        if len(batches) == 1:
+            return batches[0]
+        return cls(*(np.concatenate([getattr(b, name) for b in batches])
+                     for name in ('timestamp', 'x', 'y', 'z', 'activity_count')),
+                   rejected=sum(b.rejected for b in batches), generation=batches[-1].generation)
+
+
+def is_data_frame(payload: bytes) -> bool:
+    """ cheap check for a ``YYMMDDhhmmss,...`` frame """
+    return (len(payload) > TIMESTAMP_LEN and payload[TIMESTAMP_LEN] == _COMMA
+            and payload[:TIMESTAMP_LEN].isdigit())
+
+
+def _float_columns(rows: List[list]):
+    """ convert the value fields of equal width rows to float columns """
+    return [np.array(col, dtype=bytes).astype(np.float64) for col in list(zip(*rows))[1:]]
+
+
+def _well_formed(row) -> bool:
+    try:
+        for value in row[1:]:
+            float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _count(value: bytes) -> int:
+    """ activity count field, raises ``ValueError`` for non finite or out of range counts """
+    count = float(value)
+    if not -_COUNT_LIMIT <= count < _COUNT_LIMIT:
+        raise ValueError(f"invalid count {value!r}")
+    return int(count)
+
+
+def _valid_counts(counts: np.ndarray) -> np.ndarray:
+    """ column-wise ``_count`` check """
+    return (counts >= -_COUNT_LIMIT) & (counts < _COUNT_LIMIT)
+
+
+def _parse_rows(payloads: List[Union[bytes, bytearray, str]], decoder: TimestampDecoder) -> FrameBatch:
+    """ row by row ``parse_frames`` through the memoized ``TimestampDecoder.decode`` """
+    timestamp, x, y, z, count = [], [], [], [], []
+    rejected = 0
+    for payload in payloads:
+        if isinstance(payload, str):
+            payload = payload.encode()
+        payload = bytes(payload).strip(b'\r\n\x00 ')
+        if not is_data_frame(payload):
+            rejected += 1
+            continue
+        row = payload.split(b',')
+        try:
+            if len(row) == 2:
+                values = 0.0, 0.0, 0.0, _count(row[1])
+            elif len(row) == 4:
+                values = float(row[1]), float(row[2]), float(row[3]), NO_COUNT
+            elif len(row) == 5:
+                values = float(row[1]), float(row[2]), float(row[3]), _count(row[4])
+            else:
+                rejected += 1
+                continue
+            stamp = decoder.decode(row[0])
+        except (ValueError, OverflowError):
+            rejected += 1
+            continue
+        timestamp.append(stamp)
+        x.append(values[0])
+        y.append(values[1])
+        z.append(values[2])
+        count.append(values[3])
+    if not timestamp:
+        return FrameBatch.empty(rejected)
+    return FrameBatch(np.array(timestamp, np.int64), np.array(x, np.float64), np.array(y, np.float64),
+                      np.array(z, np.float64), np.array(count, np.int64), rejected)
+
+
+def parse_frames(payloads: Iterable[Union[bytes, bytearray, str]],
+                 decoder: Optional[TimestampDecoder] = None) -> FrameBatch:
+    """ parse a batch of raw notification payloads, non data frames are counted as rejected """
+    if not isinstance(payloads, list):
+        payloads = list(payloads)
+    if len(payloads) < SMALL_BATCH:
+        return _parse_rows(payloads, decoder or _decoder)
+    rows_by_width = {2: [], 4: [], 5: []}
+    order_by_width = {2: [], 4: [], 5: []}
+    rejected = 0
+    for i, payload in enumerate(payloads):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        payload = bytes(payload).strip(b'\r\n\x00 ')
+        if not is_data_frame(payload):
+            rejected += 1
+            continue
+        row = payload.split(b',')
+        bucket = rows_by_width.get(len(row))
+        if bucket is None:
+            rejected += 1
+            continue
+        bucket.append(row)
+        order_by_width[len(row)].append(i)
+
+    parts = []
+    for width, rows in rows_by_width.items():
+        if not rows:
+            continue
+        order = order_by_width[width]
+        try:
+            cols = _float_columns(rows)
+        except ValueError:
+            kept = [k for k, row in enumerate(rows) if _well_formed(row)]
+            rejected += len(rows) - len(kept)
+            if not kept:
+                continue
+            rows, order = [rows[k] for k in kept], [order[k] for k in kept]
+            cols = _float_columns(rows)
+        order, stamps = np.array(order), np.array([r[0] for r in rows], dtype='S12')
+        n = len(rows)
+        if width == 2:
+            x, y, z, count = np.zeros(n), np.zeros(n), np.zeros(n), cols[0]
+        else:
+            x, y, z = cols[:3]
+            count = cols[3] if width == 5 else np.full(n, NO_COUNT, np.float64)
+        valid = _valid_counts(count)
+        if not valid.all():
+            rejected += int((~valid).sum())
+            order, stamps, x, y, z, count = order[valid], stamps[valid], x[valid], y[valid], z[valid], count[valid]
+        parts.append((order, stamps, x, y, z, count.astype(np.int64)))
+
+    if not parts:
+        return FrameBatch.empty(rejected)
+
+    if len(parts) == 1:
+        _, stamps, x, y, z, count = parts[0]
+    else:
+        # restore arrival order across the frame layouts
+        order, stamps, x, y, z, count = (np.concatenate(col) for col in zip(*parts))
+        sort = np.argsort(order, kind='stable')
+        stamps, x, y, z, count = stamps[sort], x[sort], y[sort], z[sort], count[sort]
+    epoch, valid = (decoder or _decoder).decode_array(stamps)
+    if not valid.all():
+        rejected += int((~valid).sum())
+        epoch, x, y, z, count = epoch[valid], x[valid], y[valid], z[valid], count[valid]
+    return FrameBatch(epoch, x, y, z, count, rejected)
+
+
+def parse_file(path: Union[str, Path], decoder: Optional[TimestampDecoder] = None) -> FrameBatch:
+    """ parse a CSV recorded on the SD card, the header line is counted as rejected """
+    with open(path, 'rb') as f:
+        return parse_frames(f.read().splitlines(), decoder)
@@ -0,0 +1,158 @@
+# coding:utf-8
+"""
+Ingest pipeline between ``QBleakClient`` and the streaming view.
+
+Notifications are queued as raw bytes by ``submit``, a worker thread reassembles
+them into frames, classifies them with a ``MessageDispatcher`` and parses them,
+and completed ``FrameBatch`` objects wait in a bounded queue until the GUI
+drains them. Non data messages (battery, info...) are sent
+back to the GUI thread through ``controlMessage``. Both signals carry the
+``source`` of the pipeline, the device address when several devices stream at once.
+
+Notifications are tagged with the ``generation`` current when they were
+submitted, and a batch only ever holds frames of one generation. The owner bumps
+it when the link drops, so batches of the old link that are still queued can be
+told apart from the first samples of the next one.
+"""
+import queue
+import threading
+from typing import List
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from ..ble.uart_framing import FrameReassembler
+from ..common.instrumentation import instrumentation
+from .dispatcher import DATA, UNKNOWN, MessageDispatcher
+from .parser import FrameBatch, parse_frames
+from .timestamp import TimestampDecoder
+
+
+class IngestPipeline(QObject):
+    """ Off GUI thread decode/parse stage """
+
+    controlMessage = pyqtSignal(str, bytearray)
+    batchReady = pyqtSignal(str, int)
+
+    def __init__(self, source="", max_batches=64, delimited=False, parent=None):
+        super().__init__(parent)
+        self.source = source
+        self.batches = queue.Queue(maxsize=max_batches)
+        self._inbox = queue.SimpleQueue()
+        self._pending = []  # batches waiting for room in self.batches, worker only
+        self._decoder = TimestampDecoder()
+        self.reassembler = FrameReassembler(delimited=delimited)  # worker only
+        self.generation = 0  # GUI thread only
+        self._worker_generation = 0
+        self.failures = 0  # batches dropped because processing raised
+        # same classification as the control handlers of the GUI, data stays on the worker
+        self.dispatcher = MessageDispatcher(stage="ingest")  # worker only
+        self.dispatcher.register(DATA, self._collect_frame)
+        self.dispatcher.register(UNKNOWN, self._forward_control)
+        self._frames = []  # data frames of the notifications being processed, worker only
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="ble-ingest", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        if self._thread is None:
+            return
+        self._inbox.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, payload: bytearray):
+        """ queue a raw notification, safe to call from the BLE callback """
+        self._inbox.put((self.generation, [bytes(payload)]))
+
+    def submit_many(self, payloads: List[bytearray]):
+        """ queue a batch of notifications coalesced by ``QBleakClient`` """
+        self._inbox.put((self.generation, [bytes(payload) for payload in payloads]))
+
+    def drain(self) -> List[FrameBatch]:
+        """ completed batches, called from the GUI thread """
+        batches = []
+        while True:
+            try:
+                batches.append(self.batches.get_nowait())
+            except queue.Empty:
+                return batches
+
+    def _run(self):
+        running = True
+        while running:
+            try:
+                # wake up regularly while batches are held back by a full queue
+                item = self._inbox.get(timeout=0.05 if self._pending else None)
+            except queue.Empty:
+                self._hand_over()
+                continue
+            payloads = []
+            while item is not None:
+                generation, items = item
+                if generation != self._worker_generation:
+                    # frames never span two links
+                    self._process_guarded(payloads)
+                    payloads = []
+                    self.reassembler.reset()
+                    self._worker_generation = generation
+                payloads.extend(items)
+                try:
+                    item = self._inbox.get_nowait()
+                except queue.Empty:
+                    break
+            else:
+                running = False
+            self._process_guarded(payloads)
+
+    def _process_guarded(self, payloads: List[bytes]):
+        """ a batch that fails to process is dropped, the worker keeps running """
+        try:
+            self._process(payloads)
+        except Exception as e:
+            self.failures += 1
+            instrumentation.count("ingest_error")
+            instrumentation.log_sampled("ingest_error", "dropped {} notifications: {!r}", len(payloads), e,
+                                        level="ERROR")
+
+    def _collect_frame(self, frame: bytes):
+        self._frames.append(frame)
+
+    def _forward_control(self, frame: bytes):
+        self.controlMessage.emit(self.source, bytearray(frame))
+
+    def _process(self, payloads: List[bytes]):
+        if not payloads:
+            self._hand_over()
+            return
+        frames = self._frames = []
+        with instrumentation.timer("decode", len(payloads)):
+            for payload in payloads:
+                for frame in self.reassembler.feed(payload):
+                    self.dispatcher.dispatch(frame)
+        if frames:
+            with instrumentation.timer("parse", len(frames)):
+                batch = parse_frames(frames, self._decoder)
+            if batch.rejected:
+                instrumentation.log_sampled("parse", "{} malformed frames", batch.rejected, level="WARNING")
+            if len(batch):
+                batch.generation = self._worker_generation
+                self._pending.append(batch)
+        self._hand_over()
+
+    def _hand_over(self):
+        while self._pending:
+            # a slow GUI never blocks the worker, batches of a generation are merged until there is room
+            generation = self._pending[0].generation
+            n = next((i for i, b in enumerate(self._pending) if b.generation != generation), len(self._pending))
+            batch = FrameBatch.concatenate(self._pending[:n])
+            try:
+                self.batches.put_nowait(batch)
+            except queue.Full:
+                self._pending[:n] = [batch]
+                return
+            del self._pending[:n]
+            self.batchReady.emit(self.source, len(batch))
@@ -0,0 +1,125 @@
+# coding:utf-8
+"""
+Multi-resolution summary of a whole session for zoomed out views.
+
+Level 0 holds the min, max and mean of every ``base`` consecutive samples, each
+further level summarises ``factor`` entries of the level below. Entries are
+added as soon as their bucket is complete, so keeping the pyramid current costs
+O(1) amortised per sample, and with the default sizes it takes an eighth of the
+memory of the samples themselves.
+
+A view over any range picks the coarsest level that still has one entry per
+pixel column, so a redraw touches O(columns) entries whether the range is a
+minute or a day.
+"""
+from typing import List
+
+import numpy as np
+
+CHANNELS = ("x", "y", "z", "activity_count")
+
+
+class _Level:
+    """ Growable min/max/sum columns of one resolution """
+
+    def __init__(self, bucket, channels, capacity=1024):
+        self.bucket = bucket  # samples per entry
+        self.n = 0
+        self.lo = np.empty((channels, capacity))
+        self.hi = np.empty((channels, capacity))
+        self.sum = np.empty((channels, capacity))
+
+    def extend(self, lo, hi, total):
+        k = lo.shape[1]
+        if self.n + k > self.lo.shape[1]:
+            capacity = max(2 * self.lo.shape[1], self.n + k)
+            for name in ("lo", "hi", "sum"):
+                grown = np.empty((self.lo.shape[0], capacity))
+                grown[:, :self.n] = getattr(self, name)[:, :self.n]
+                setattr(self, name, grown)
+        self.lo[:, self.n:self.n + k] = lo
+        self.hi[:, self.n:self.n + k] = hi
+        self.sum[:, self.n:self.n + k] = total
+        self.n += k
+
+
+class SummaryPyramid:
+    """ Per level min/max/mean of ``channels`` values, fed in sample order """
+
+    def __init__(self, base=32, factor=4, channels=len(CHANNELS)):
+        self.base = base
+        self.factor = factor
+        self.channels = channels
+        self.total = 0
+        self.levels = [_Level(base, channels)]  # type: List[_Level]
+        self._pending = np.empty((channels, base))
+        self._n_pending = 0
+
+    def clear(self):
+        self.__init__(self.base, self.factor, self.channels)
+
+    def extend(self, values: np.ndarray):
+        """ add samples, ``values`` has shape ``(channels, n)`` """
+        n = values.shape[1]
+        self.total += n
+        i = 0
+        if self._n_pending:
+            i = min(self.base - self._n_pending, n)
+            self._pending[:, self._n_pending:self._n_pending + i] = values[:, :i]
+            self._n_pending += i
+            if self._n_pending < self.base:
+                return
+            self._add_base(self._pending)
+            self._n_pending = 0
+        complete = (n - i) // self.base * self.base
+        if complete:
+            self._add_base(values[:, i:i + complete])
+            i += complete
+        rest = n - i
+        self._pending[:, :rest] = values[:, i:]
+        self._n_pending = rest
+
+    def _add_base(self, values):
+        v = values.reshape(self.channels, -1, self.base)
+        self.levels[0].extend(v.min(axis=2), v.max(axis=2), v.sum(axis=2))
+        # carry complete groups of entries up the levels
+        level = 0
+        while self.levels[level].n >= self.factor:
+            below = self.levels[level]
+            if level + 1 == len(self.levels):
+                self.levels.append(_Level(below.bucket * self.factor, self.channels))
+            above = self.levels[level + 1]
+            done = above.n * self.factor
+            groups = (below.n - done) // self.factor
+            if groups == 0:
+                break
+            stop = done + groups * self.factor
+            shape = (self.channels, groups, self.factor)
+            above.extend(below.lo[:, done:stop].reshape(shape).min(axis=2),
+                         below.hi[:, done:stop].reshape(shape).max(axis=2),
+                         below.sum[:, done:stop].reshape(shape).sum(axis=2))
+            level += 1
+
+    def level_for(self, span, columns) -> int:
+        """ coarsest level with at least ``columns`` entries over ``span`` samples, -1 for raw samples """
+        level = -1
+        for i, lvl in enumerate(self.levels):
+            if span / lvl.bucket < columns:
+                break
+            level = i
+        return level
+
+    def query(self, level, start, stop):
+        """
+        ``(x, lo, hi, mean)`` of the entries of ``level`` overlapping samples
+        ``[start, stop)``; x is the sequence number where each entry starts
+        """
+        lvl = self.levels[level]
+        first = max(0, start // lvl.bucket)
+        last = min(lvl.n, -(-stop // lvl.bucket))
+        if first >= last:
+            empty = np.empty((self.channels, 0))
+            return np.empty(0), empty, empty, empty
+        x = np.arange(first, last, dtype=float) * lvl.bucket
+        mean = lvl.sum[:, first:last] / lvl.bucket
+        return x, lvl.lo[:, first:last], lvl.hi[:, first:last], mean
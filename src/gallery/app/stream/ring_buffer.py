@@ -0,0 +1,99 @@
+# coding:utf-8
+"""
+Fixed capacity store for the live samples.
+
+Every sample is written twice, at ``i`` and ``i + capacity`` of a preallocated
+array, so the last ``n`` samples are always one contiguous slice that can be
+handed out as a view without copying.
+
+Samples are numbered in arrival order from 0, ``total`` is the sequence number
+of the next one. Consumers keep the number they stopped at and ask for what came
+``since``, new data is detected by comparing two integers instead of values.
+"""
+import numpy as np
+
+from .parser import NO_COUNT, FrameBatch
+
+SAMPLE_DTYPE = np.dtype([
+    ('timestamp', np.int64),
+    ('x', np.float64),
+    ('y', np.float64),
+    ('z', np.float64),
+    ('activity_count', np.int64),
+])
+
+DEFAULT_CAPACITY = 30 * 60 * 60 * 4  # 4 hours at 30Hz
+
+
+def batch_to_rows(batch: FrameBatch) -> np.ndarray:
+    """ the samples of a parsed batch as ``SAMPLE_DTYPE`` rows """
+    rows = np.empty(len(batch), SAMPLE_DTYPE)
+    rows['timestamp'] = batch.timestamp
+    rows['x'] = batch.x
+    rows['y'] = batch.y
+    rows['z'] = batch.z
+    rows['activity_count'] = batch.activity_count
+    return rows
+
+
+class SampleRingBuffer:
+    """ Structured ring buffer of ``(timestamp, x, y, z, activity_count)`` samples """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.total = 0  # samples appended since the last clear
+        self._head = 0  # next write position in [0, capacity)
+        self._data = np.zeros(2 * capacity, SAMPLE_DTYPE)
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def clear(self):
+        self.total = 0
+        self._head = 0
+
+    def append(self, timestamp, x, y, z, activity_count=NO_COUNT):
+        row = (timestamp, x, y, z, NO_COUNT if activity_count is None else activity_count)
+        self._data[self._head] = row
+        self._data[self._head + self.capacity] = row
+        self._head = (self._head + 1) % self.capacity
+        self.total += 1
+
+    def extend(self, batch: FrameBatch):
+        if len(batch):
+            self.extend_rows(batch_to_rows(batch))
+
+    def extend_rows(self, rows: np.ndarray):
+        """ append an array of ``SAMPLE_DTYPE`` rows """
+        n = len(rows)
+        self.total += n
+        if n > self.capacity:
+            rows = rows[-self.capacity:]
+            n = self.capacity
+        first = min(n, self.capacity - self._head)
+        for offset in (0, self.capacity):
+            self._data[self._head + offset:self._head + offset + first] = rows[:first]
+            self._data[offset:offset + n - first] = rows[first:]
+        self._head = (self._head + n) % self.capacity
+
+    def latest(self, n=None) -> np.ndarray:
+        """ view of the last ``n`` samples (all stored samples by default), oldest first """
+        size = len(self)
+        n = size if n is None else max(0, min(n, size))
+        end = self._head + self.capacity
+        return self._data[end - n:end]
+
+    def since(self, seq):
+        """
+        view of the stored samples numbered ``seq`` and later, with the sequence
+        number of its first row (later than ``seq`` if older samples were overwritten)
+        """
+        n = max(0, min(self.total - seq, len(self)))
+        return self.latest(n), self.total - n
+
+    def last(self):
+        """ the newest sample as a ``[timestamp, x, y, z, activity_count]`` row, or None """
+        if self.total == 0:
+            return None
+        row = self._data[self._head + self.capacity - 1].tolist()
+        return [*row[:4], None if row[4] == NO_COUNT else row[4]]
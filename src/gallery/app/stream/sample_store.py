@@ -0,0 +1,213 @@
+# coding:utf-8
+"""
+Session history in two tiers: a hot ring buffer in RAM and cold chunks on disk.
+
+New samples go to a ``SampleRingBuffer`` that serves the live views. Every
+``chunk_size`` samples, the ones not on disk yet are appended to a spill file as
+raw ``SAMPLE_DTYPE`` records, so the file always holds samples ``[0, spilled)``
+and the ring the last ``capacity`` ones. Nothing is dropped when the ring wraps,
+memory stays at the size of the ring however long the session runs, and ``read``
+returns any range of sequence numbers across both tiers. A ``SummaryPyramid``
+fed on append answers zoomed out views of the whole session with ``summary``.
+Activity counts computed on the client, one per epoch, are recorded next to it
+with ``add_counts`` and merged into the ``activity_count`` channel of ``summary``.
+
+The spill file is an anonymous temporary file, removed by the OS when the store
+is closed or the process exits.
+"""
+import tempfile
+from typing import Iterator
+
+import numpy as np
+
+from .parser import NO_COUNT, FrameBatch
+from .pyramid import CHANNELS, SummaryPyramid
+from .ring_buffer import SAMPLE_DTYPE, SampleRingBuffer, batch_to_rows
+
+HOT_CAPACITY = 30 * 60 * 60  # 1 hour at 30Hz
+CHUNK_SIZE = 30 * 60 * 5  # 5 minutes at 30Hz
+
+
+def summary_values(rows: np.ndarray) -> np.ndarray:
+    """ the ``CHANNELS`` of ``rows`` as a float array, samples without count count 0 """
+    values = np.empty((len(CHANNELS), len(rows)))
+    for i, name in enumerate(CHANNELS):
+        values[i] = rows[name]
+    np.maximum(values[-1], 0, out=values[-1])
+    return values
+
+
+class TieredSampleStore:
+    """ ``SampleRingBuffer`` whose overwritten samples are kept in a spill file """
+
+    def __init__(self, capacity=HOT_CAPACITY, chunk_size=CHUNK_SIZE, spill_dir=None):
+        if chunk_size > capacity:
+            raise ValueError("chunk_size must not exceed the capacity")
+        self.hot = SampleRingBuffer(capacity)
+        self.chunk_size = chunk_size
+        self.spill_dir = spill_dir
+        self.spilled = 0  # samples [0, spilled) are on disk
+        self.pyramid = SummaryPyramid()
+        self._count_seq = np.empty(1024, np.int64)
+        self._count_values = np.empty(1024)
+        self._n_counts = 0
+        self._file = None
+
+    @property
+    def capacity(self):
+        return self.hot.capacity
+
+    @property
+    def total(self):
+        return self.hot.total
+
+    def __len__(self):
+        return self.hot.total
+
+    def clear(self):
+        self.hot.clear()
+        self.pyramid.clear()
+        self._n_counts = 0
+        self.spilled = 0
+        if self._file is not None:
+            self._file.seek(0)
+            self._file.truncate()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def append(self, timestamp, x, y, z, activity_count=NO_COUNT):
+        row = np.array([(timestamp, x, y, z, NO_COUNT if activity_count is None else activity_count)],
+                       SAMPLE_DTYPE)
+        self.extend_rows(row)
+
+    def extend(self, batch: FrameBatch):
+        if len(batch):
+            self.extend_rows(batch_to_rows(batch))
+
+    def extend_rows(self, rows: np.ndarray):
+        """ append an array of ``SAMPLE_DTYPE`` rows """
+        unspilled = self.hot.total - self.spilled
+        if unspilled + len(rows) > self.capacity:
+            # the ring would overwrite samples that are not on disk yet
+            self._spill(self.hot.since(self.spilled)[0])
+            overflow = len(rows) - self.capacity
+            if overflow > 0:
+                self._spill(rows[:overflow])
+        self.hot.extend_rows(rows)
+        self.pyramid.extend(summary_values(rows))
+        if self.hot.total - self.spilled >= self.chunk_size:
+            self._spill(self.hot.since(self.spilled)[0])
+
+    def add_counts(self, seq, counts):
+        """
+        record activity counts computed on the client at the sequence numbers of
+        the samples that completed their epochs, counts up to the last one are ignored
+        """
+        seq = np.asarray(seq, np.int64)
+        counts = np.asarray(counts, float)
+        if self._n_counts:
+            keep = seq > self._count_seq[self._n_counts - 1]
+            seq, counts = seq[keep], counts[keep]
+        k = len(seq)
+        if not k:
+            return
+        if self._n_counts + k > len(self._count_seq):
+            capacity = max(2 * len(self._count_seq), self._n_counts + k)
+            for name in ("_count_seq", "_count_values"):
+                old = getattr(self, name)
+                grown = np.empty(capacity, old.dtype)
+                grown[:self._n_counts] = old[:self._n_counts]
+                setattr(self, name, grown)
+        self._count_seq[self._n_counts:self._n_counts + k] = seq
+        self._count_values[self._n_counts:self._n_counts + k] = counts
+        self._n_counts += k
+
+    def counts(self):
+        """ ``(seq, counts)`` recorded with ``add_counts`` """
+        return self._count_seq[:self._n_counts], self._count_values[:self._n_counts]
+
+    def _spill(self, rows: np.ndarray):
+        if not len(rows):
+            return
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix="samples_", suffix=".bin", dir=self.spill_dir)
+        self._file.seek(0, 2)
+        self._file.write(rows.tobytes())
+        self.spilled += len(rows)
+
+    def latest(self, n=None) -> np.ndarray:
+        """ view of the last ``n`` samples of the hot tier """
+        return self.hot.latest(n)
+
+    def since(self, seq):
+        """ hot tier samples from sequence number ``seq`` on, see ``SampleRingBuffer.since`` """
+        return self.hot.since(seq)
+
+    def last(self):
+        return self.hot.last()
+
+    def read(self, start=0, stop=None) -> np.ndarray:
+        """ copy of samples ``[start, stop)`` read across both tiers """
+        stop = self.total if stop is None else min(stop, self.total)
+        start = max(0, start)
+        if start >= stop:
+            return np.empty(0, SAMPLE_DTYPE)
+        hot_start = self.total - len(self.hot)
+        if start >= hot_start:
+            return self.hot.latest(self.total - start)[:stop - start].copy()
+        out = np.empty(stop - start, SAMPLE_DTYPE)
+        cold_stop = min(stop, hot_start)
+        self._file.flush()
+        self._file.seek(start * SAMPLE_DTYPE.itemsize)
+        out[:cold_stop - start] = np.fromfile(self._file, SAMPLE_DTYPE, cold_stop - start)
+        if stop > hot_start:
+            out[cold_stop - start:] = self.hot.latest(len(self.hot))[:stop - hot_start]
+        return out
+
+    def iter_chunks(self, chunk_rows=1000000) -> Iterator[np.ndarray]:
+        """ the whole session in blocks of at most ``chunk_rows`` samples, oldest first """
+        for start in range(0, self.total, chunk_rows):
+            yield self.read(start, start + chunk_rows)
+
+    def summary(self, start, stop, columns):
+        """
+        ``(x, lo, hi, mean)`` over samples ``[start, stop)`` at about ``columns``
+        entries, per channel of ``CHANNELS``. The range is covered by the coarsest
+        pyramid level that resolves ``columns``, its unsummarised end by finer
+        levels and finally by the raw samples. Counts recorded with ``add_counts``
+        are merged into the max and mean of the ``activity_count`` channel.
+        """
+        stop = min(stop, self.total)
+        start = max(0, min(start, stop))
+        parts = []
+        pos = start
+        level = self.pyramid.level_for(stop - start, columns)
+        while level >= 0 and pos < stop:
+            x, lo, hi, mean = self.pyramid.query(level, pos, stop)
+            if len(x):
+                parts.append((x, lo, hi, mean))
+                pos = int(x[-1]) + self.pyramid.levels[level].bucket
+            level -= 1
+        if pos < stop:
+            values = summary_values(self.read(pos, stop))
+            parts.append((np.arange(pos, stop, dtype=float), values, values, values))
+        if not parts:
+            empty = np.empty((len(CHANNELS), 0))
+            return np.empty(0), empty, empty, empty
+        x, lo, hi, mean = (np.concatenate(arrays, axis=-1) for arrays in zip(*parts))
+        self._merge_counts(x, stop, hi[-1], mean[-1])
+        return x, lo, hi, mean
+
+    def _merge_counts(self, x, stop, hi, mean):
+        """ add the recorded counts within ``[x[0], stop)`` to the entries starting at ``x`` """
+        seq, counts = self.counts()
+        first, last = np.searchsorted(seq, (x[0], stop))
+        if first == last:
+            return
+        entry = np.searchsorted(x, seq[first:last], side='right') - 1
+        np.maximum.at(hi, entry, counts[first:last])
+        width = np.diff(np.append(x, stop))
+        np.add.at(mean, entry, counts[first:last] / width[entry])
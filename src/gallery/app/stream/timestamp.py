@@ -0,0 +1,114 @@
+# coding:utf-8
+"""
+Decoder for the 12 digit ``YYMMDDhhmmss`` timestamps written by the wearable.
+
+At 25-30Hz every sample of a second carries the same stamp, so the decoder keeps
+the last decoded second and bounded LRUs of recent dates, minutes and UTC offsets
+instead of calling ``strptime`` for every row. ``decode_array`` converts whole
+columns for large batches and only shares the UTC offset cache.
+"""
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Union
+
+import numpy as np
+
+TIMESTAMP_LEN = 12
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+_PIVOT_YY = 69  # like ``%y``, 69-99 are 19xx and 00-68 are 20xx
+
+
+def _year(yy):
+    return yy + 1900 if yy >= _PIVOT_YY else yy + 2000
+
+
+class TimestampDecoder:
+    """ ``YYMMDDhhmmss`` to local epoch seconds, same result as ``strptime(...).timestamp()`` """
+
+    def __init__(self, max_prefixes=64):
+        self.max_prefixes = max_prefixes
+        self.hits = 0
+        self.misses = 0
+        self._last_stamp = None
+        self._last_epoch = None
+        self._dates = OrderedDict()    # YYMMDD -> naive epoch of midnight
+        self._minutes = OrderedDict()  # YYMMDDhhmm -> local epoch of the minute
+        self._offsets = OrderedDict()  # naive epoch of an hour -> UTC offset
+
+    def _remember(self, cache: OrderedDict, key, value):
+        cache[key] = value
+        if len(cache) > self.max_prefixes:
+            cache.popitem(last=False)
+
+    def _date(self, prefix) -> int:
+        midnight = self._dates.get(prefix)
+        if midnight is None:
+            day = date(_year(int(prefix[0:2])), int(prefix[2:4]), int(prefix[4:6]))
+            midnight = (day.toordinal() - _EPOCH_ORDINAL) * 86400
+            self._remember(self._dates, prefix, midnight)
+        else:
+            self._dates.move_to_end(prefix)
+        return midnight
+
+    def offset(self, naive_hour: int) -> int:
+        """ seconds to subtract from the naive epoch of an hour to get the local epoch """
+        offset = self._offsets.get(naive_hour)
+        if offset is None:
+            offset = naive_hour - int((_EPOCH + timedelta(seconds=naive_hour)).timestamp())
+            self._remember(self._offsets, naive_hour, offset)
+        return offset
+
+    def _minute(self, prefix) -> int:
+        epoch = self._minutes.get(prefix)
+        if epoch is None:
+            hour, minute = int(prefix[6:8]), int(prefix[8:10])
+            if hour > 23 or minute > 59:
+                raise ValueError(f"invalid timestamp {prefix!r}")
+            naive_hour = self._date(prefix[:6]) + hour * 3600
+            # DST changes on hour boundaries, the offset of the hour holds for every minute
+            epoch = naive_hour - self.offset(naive_hour) + minute * 60
+            self._remember(self._minutes, prefix, epoch)
+        else:
+            self._minutes.move_to_end(prefix)
+        return epoch
+
+    def decode(self, stamp: Union[str, bytes]) -> int:
+        """ decode one stamp, raises ``ValueError`` like ``strptime`` on malformed input """
+        if stamp == self._last_stamp:
+            self.hits += 1
+            return self._last_epoch
+        self.misses += 1
+        if len(stamp) != TIMESTAMP_LEN or not stamp.isdigit():
+            raise ValueError(f"invalid timestamp {stamp!r}")
+        second = int(stamp[10:12])
+        if second > 59:
+            raise ValueError(f"invalid timestamp {stamp!r}")
+        epoch = self._minute(stamp[:10]) + second
+        self._last_stamp, self._last_epoch = stamp, epoch
+        return epoch
+
+    def decode_array(self, stamps: np.ndarray):
+        """
+        Decode an ``S12`` array of stamps column-wise.
+
+        Returns ``(epoch, valid)``, ``valid`` flags the stamps that ``decode`` would
+        have accepted.
+        """
+        digits = np.frombuffer(stamps.tobytes(), np.uint8).reshape(-1, TIMESTAMP_LEN).astype(np.int64) - 48
+        pairs = digits[:, 0::2] * 10 + digits[:, 1::2]
+        yy, mo, dd, hh, mi, ss = pairs.T
+
+        valid = (digits >= 0).all(axis=1) & (digits <= 9).all(axis=1)
+        valid &= (mo >= 1) & (mo <= 12) & (dd >= 1) & (hh < 24) & (mi < 60) & (ss < 60)
+        months = (np.where(yy >= _PIVOT_YY, 1900, 2000) + yy - 1970) * 12 + np.clip(mo, 1, 12) - 1
+        month_start = months.astype('datetime64[M]').astype('datetime64[D]')
+        next_month = (months + 1).astype('datetime64[M]').astype('datetime64[D]')
+        day = month_start + (np.maximum(dd, 1) - 1)
+        valid &= day < next_month
+
+        naive = day.astype(np.int64) * 86400 + hh * 3600 + mi * 60 + ss
+        hours, inverse = np.unique(naive - naive % 3600, return_inverse=True)
+        offsets = np.array([self.offset(int(h)) for h in hours], dtype=np.int64)
+        return naive - offsets[inverse.reshape(-1)], valid
@@ -0,0 +1,70 @@
+# coding:utf-8
+"""
+Preallocated storage for the points of the live plot curves.
+
+The x coordinate of a point is written once when the point is added, next to its
+values, using the same mirrored layout as ``SampleRingBuffer``: the visible window
+is always a contiguous view that can be passed to ``setData`` as is. Adding points
+costs O(new points) and handing out the window costs nothing, however long the
+session runs.
+"""
+import numpy as np
+
+
+class TraceBuffer:
+    """ Last ``window`` points of ``channels`` curves sharing their x coordinates """
+
+    def __init__(self, window, channels=3):
+        self.window = window
+        self.channels = channels
+        self.total = 0  # points added since the last clear, also the x of the next point
+        self._head = 0
+        self._x = np.zeros(2 * window)
+        self._y = np.zeros((channels, 2 * window))
+
+    def __len__(self):
+        return min(self.total, self.window)
+
+    def clear(self):
+        self.total = 0
+        self._head = 0
+
+    def append(self, *values):
+        for offset in (self._head, self._head + self.window):
+            self._x[offset] = self.total
+            self._y[:, offset] = values
+        self._head = (self._head + 1) % self.window
+        self.total += 1
+
+    def extend(self, values: np.ndarray, x: np.ndarray = None):
+        """ add ``values`` of shape ``(channels, n)``, x defaults to consecutive indices """
+        n = values.shape[1]
+        if x is None:
+            x = np.arange(self.total, self.total + n, dtype=float)
+        self.total += n
+        if n > self.window:
+            values, x = values[:, -self.window:], x[-self.window:]
+            n = self.window
+        first = min(n, self.window - self._head)
+        for offset in (0, self.window):
+            start = self._head + offset
+            self._x[start:start + first] = x[:first]
+            self._y[:, start:start + first] = values[:, :first]
+            self._x[offset:offset + n - first] = x[first:]
+            self._y[:, offset:offset + n - first] = values[:, first:]
+        self._head = (self._head + n) % self.window
+
+    def x(self) -> np.ndarray:
+        """ view of the x coordinates of the window, oldest first """
+        end = self._head + self.window
+        return self._x[end - len(self):end]
+
+    def values(self) -> np.ndarray:
+        """ view of the window for all channels, shape ``(channels, len(self))`` """
+        end = self._head + self.window
+        return self._y[:, end - len(self):end]
+
+    def y(self, channel=0) -> np.ndarray:
+        """ view of the values of ``channel`` in the window, oldest first """
+        end = self._head + self.window
+        return self._y[channel, end - len(self):end]
@@ -1,5 +1,5 @@
 # coding:utf-8
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QResizeEvent
 from PyQt5.QtWidgets import QFileDialog
 
@@ -14,52 +14,25 @@ from datetime import datetime
 from pathlib import Path
 
 from .gallery_interface import GalleryInterface
+from ..components.activity_plot import ActivityBars
 from ..common.translator import Translator
 from ..common.config import cfg
+from ..common.instrumentation import instrumentation
+from ..common.render_scheduler import RenderScheduler
+from ..stream.activity import ActivityCountEngine
+from ..stream.autoscale import RunningExtrema
+from ..stream.decimator import MinMaxDecimator
+from ..stream.parser import NO_COUNT
+from ..stream.sample_store import TieredSampleStore
+from ..stream.trace import TraceBuffer
 from datetime import datetime, timedelta
 from scipy.interpolate import interp1d
 
 
-class ActivityCounter:
-    def __init__(self, threshold, window_size_sec):
-        self.threshold = threshold
-        self.window_size_sec = window_size_sec
-        self.buffer_x = []
-        self.buffer_y = []
-        self.buffer_z = []
-        self.activity_counts = []
-
-    def add_data(self, x, y, z):
-        # Append the incoming data point to buffers
-        self.buffer_x.append(x)
-        self.buffer_y.append(y)
-        self.buffer_z.append(z)
-
-        # Process if we have enough data for at least one window
-        if len(self.buffer_x) >= self.window_size_sec:
-            # Extract window data
-            window_x = self.buffer_x[:self.window_size_sec]
-            window_y = self.buffer_y[:self.window_size_sec]
-            window_z = self.buffer_z[:self.window_size_sec]
-
-            # Remove the processed window data from the buffers
-            self.buffer_x = self.buffer_x[self.window_size_sec:]
-            self.buffer_y = self.buffer_y[self.window_size_sec:]
-            self.buffer_z = self.buffer_z[self.window_size_sec:]
-
-            # Calculate magnitude of the window
-            magnitude = np.sqrt(np.square(window_x) + np.square(window_y) + np.square(window_z))
-
-            # Count the number of times the magnitude exceeds the threshold
-            count = np.sum(magnitude > self.threshold)
-            self.activity_counts.append(int(count))
-
-    def get_activity_counts(self):
-        return self.activity_counts
-
-
 class DataStreamingInterface(GalleryInterface):
 
+    sessionSelected = pyqtSignal(str)  # address of the device picked in the device selector
+
     def __init__(self, parent=None):
         t = Translator()
         super().__init__(
@@ -67,7 +40,6 @@ class DataStreamingInterface(GalleryInterface):
             subtitle='View real-time data.',
             parent=parent
         )
-        self.timer = QtCore.QTimer()
         self.setObjectName('Data')
         self.toolBar.exportButton.setVisible(True)
         self.toolBar.connectButton.setVisible(False)
@@ -80,24 +52,34 @@ class DataStreamingInterface(GalleryInterface):
             self.toolBar.batteryWidget.setVisible(True)
         self.toolBar.helpButton.setVisible(False)
         self.toolBar.batteryWidget.setVisible(False)
-        self.refresh_interval = 1
         self.controlInterface = None
-        self.incoming_data = False
-        self.ble_data = [[datetime.now(), 0, 0, 0, None]]
-        self.time_xyz = []
+        self.sessions = None
+        self.session = None
+        self.samples = TieredSampleStore(capacity=1, chunk_size=1)  # replaced by the store of the active session
         self.win_size = 60 * 30
+        self.trace = TraceBuffer(self.win_size)
+        self.decimator = MinMaxDecimator(self.win_size)
+        self.autoscale = RunningExtrema(self.win_size, robust=cfg.get(cfg.robustAutoscale))
+        self.y_range = None
+        self.follow_y = True  # off once the user zooms or pans Y, back on with auto range
         self.add_xyz_plot(self)
         self.add_count_plot(self)
         self.toolBar.exportButton.clicked.connect(self.clicked_export)
+        self.toolBar.deviceComboBox.currentIndexChanged.connect(self.select_device)
         self.update_background_color()
-        activity_counter = ActivityCounter(threshold=0, window_size_sec=0)
-        self.activity_counter = activity_counter
-        self.bargraph = pg.BarGraphItem(x = [], height = [], width = 0.6, brush ='#64B4BE')
-        self.plot_count_graph.addItem(self.bargraph)
+        # counts for devices that do not send their own, same engine as for SD card files
+        self.activity_counter = ActivityCountEngine(sampling=25)
+        self.activity_bars = ActivityBars(self.plot_count_graph.getPlotItem(), self.win_size)
+        # both plots show the same samples, panning one scrolls the other
+        self.plot_count_graph.setXLink(self.plot_xyz_graph)
         self.hwid = "unknown"
-        self.timer.timeout.connect(self.update_plot)
+        self.plotted_seq = 0  # sequence number of the next sample to feed to the plot buffers
+        self.ingest_pending = False
+        self.render_scheduler = RenderScheduler(self.update_plot, cfg.get(cfg.maxFps), parent=self)
+        self.render_scheduler.enabled = False  # until the interface is shown
+        cfg.maxFps.valueChanged.connect(self.render_scheduler.set_max_fps)
+        cfg.robustAutoscale.valueChanged.connect(self.set_robust_autoscale)
         self.update_timer()
-        self.first_packet_received = False
 
     def is_timestamp_in_range(self, timestamp, window_seconds=2):
         current_time = datetime.now()
@@ -105,28 +87,6 @@ class DataStreamingInterface(GalleryInterface):
         end_time = current_time + timedelta(seconds=window_seconds)
         return start_time <= timestamp <= end_time
 
-    def parse_ble_data(self, msg):
-        activity_count = None
-        components = msg.split(',')
-        timestamp_str = components[0]
-        timestamp_ = datetime.strptime(timestamp_str, "%y%m%d%H%M%S")
-        timestamp = int(timestamp_.timestamp())
-
-        try:
-            x = float(components[1])
-            y = float(components[2])
-            z = float(components[3])
-            if len(components) > 4:
-                activity_count = int(components[4])
-        except Exception as e:
-            print(e)
-            activity_count = int(components[1])
-            x = 0
-            y = 0
-            z = 0
-        print("parse_ble_data", [timestamp, x, y, z, activity_count])
-        return [timestamp, x, y, z, activity_count]
-
     def edit_threshold(self):
         #value = self.toolBar.thresholdButton.value()
         value = 0
@@ -135,7 +95,7 @@ class DataStreamingInterface(GalleryInterface):
 
     def edit_count_w(self):
         value = self.toolBar.countWindowButton.value()
-        self.activity_counter.window_size_sec = value
+        self.activity_counter.set_epoch(value)
         print(f"count window: {value}")
 
     def clicked_theme(self):
@@ -167,7 +127,7 @@ class DataStreamingInterface(GalleryInterface):
             self.plot_xyz_graph.setBackground("#F1F3F6")
             self.plot_count_graph.setBackground("#F1F3F6")
 
-    def export_data(self, df):
+    def export_data(self, frames):
         print("exporting...")
         last_folder = cfg.get(cfg.downloadFolder)
         folder = QFileDialog.getExistingDirectory(
@@ -176,13 +136,18 @@ class DataStreamingInterface(GalleryInterface):
             return
         cfg.set(cfg.downloadFolder, folder)
         datetime_string = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{self.hwid}_{datetime_string}.csv"
-        filepath = Path(folder) / filename
-        print(f"Export to {filepath}")
-        df.to_csv(filepath, index=False)
+        filepaths = []
+        for hwid, chunks in frames.items():
+            filename = f"{hwid}_{datetime_string}.csv"
+            filepath = Path(folder) / filename
+            print(f"Export to {filepath}")
+            # written chunk by chunk, a long session is never loaded into memory at once
+            for i, df in enumerate(chunks):
+                df.to_csv(filepath, index=False, mode='w' if i == 0 else 'a', header=i == 0)
+            filepaths.append(filepath.as_posix())
         InfoBar.success(
             title=self.tr('Export Success'),
-            content=self.tr(filepath.as_posix()),
+            content=self.tr("\n".join(filepaths)),
             orient=Qt.Horizontal,
             isClosable=True,
             position=InfoBarPosition.BOTTOM,
@@ -190,24 +155,47 @@ class DataStreamingInterface(GalleryInterface):
             parent=self
         )
 
+    def samples_to_dataframe(self, rows):
+        df = pd.DataFrame(rows)
+        df['activity_count'] = df['activity_count'].where(df['activity_count'] != NO_COUNT).astype('Int64')
+        return df
+
+    def samples_to_dataframes(self, samples):
+        """ dataframes over the whole history of ``samples``, disk and memory tiers alike """
+        if samples.total == 0:
+            yield self.samples_to_dataframe(samples.latest())
+        for rows in samples.iter_chunks():
+            yield self.samples_to_dataframe(rows)
+
     def clicked_export(self):
         print("clicked_export")
-        df = pd.DataFrame(self.ble_data, columns=['timestamp', 'x', 'y', 'z', 'activity_count'])
-        print(df)
-        if len(df) <= 10:
+        if self.sessions is not None and len(self.sessions) > 0:
+            # one file per device
+            frames = {s.label: self.samples_to_dataframes(s.samples) for s in self.sessions}
+            gaps = {f"{s.label}_gaps": [pd.DataFrame([(g.start, g.end) for g in s.gaps],
+                                                     columns=['start', 'end']).astype('Int64')]
+                    for s in self.sessions if s.gaps}
+            size = sum(s.samples.total for s in self.sessions)
+        else:
+            frames = {self.hwid: self.samples_to_dataframes(self.samples)}
+            gaps = {}
+            size = len(self.samples)
+        frames.update(gaps)
+        print(f"{size} samples from {list(frames)}")
+        if size <= 10:
             print("No much data to export.")
             title = self.tr("Data content warning")
             content = self.tr(
-                f"There is only {len(df)} data points to export.\nWould you like to proceed with the export?")
+                f"There is only {size} data points to export.\nWould you like to proceed with the export?")
             w = Dialog(title, content, self.window())
             w.setContentCopyable(True)
             if w.exec():
                 print('Yes button is pressed')
-                self.export_data(df)
+                self.export_data(frames)
             else:
                 print('Cancel button is pressed')
         else:
-            self.export_data(df)
+            self.export_data(frames)
 
     # def clicked_timeWindow(self):
     #     time_str = self.toolBar.timeWindowButton.text().split(' ')[0]
@@ -232,26 +220,26 @@ class DataStreamingInterface(GalleryInterface):
         #self.plot_xyz_graph.setYRange(-200,200, 0)
         legend = self.plot_xyz_graph.addLegend()
         legend.setOffset(5)  # Adjust these values (x, y) to move the legend
+        self.plot_xyz_graph.getViewBox().sigResized.connect(self.resize_decimator)
+        self.plot_xyz_graph.getViewBox().sigXRangeChanged.connect(self.handle_x_range_changed)
+        self.plot_xyz_graph.getViewBox().sigRangeChangedManually.connect(self.handle_range_changed_manually)
 
-        self.xaxis = []
         # Get a line reference
         self.lineX = self.plot_xyz_graph.plot(
-            self.time_xyz,
-            self.xaxis,
+            self.decimator.x(),
+            self.decimator.y(0),
             name="X axis",
             pen=pg.mkPen(color=(150, 150, 150))
         )
-        self.yaxis = []
         self.lineY = self.plot_xyz_graph.plot(
-            self.time_xyz,
-            self.yaxis,
+            self.decimator.x(),
+            self.decimator.y(1),
             name="Y axis",
             pen=pg.mkPen(color=(100, 180, 190))
         )
-        self.zaxis = []
         self.lineZ = self.plot_xyz_graph.plot(
-            self.time_xyz,
-            self.zaxis,
+            self.decimator.x(),
+            self.decimator.y(2),
             name="Z axis",
             pen=pg.mkPen(color=(100, 127, 227))
         )
@@ -267,7 +255,6 @@ class DataStreamingInterface(GalleryInterface):
         )
 
     def add_count_plot(self, parent):
-        self.counts = []
         self.plot_count_graph = pg.PlotWidget()
         self.plot_count_graph.setTitle("Activity", color="black", size="10pt")
         #self.plot_count_graph.setBackground("#F1F3F6")
@@ -294,101 +281,198 @@ class DataStreamingInterface(GalleryInterface):
         )
 
     def update_timer(self):
-        if self.controlInterface is not None:
-            if self.controlInterface.accSamplingButton.text()[:-2].isdigit():
-                self.refresh_interval = int((1 / int(self.controlInterface.accSamplingButton.text()[:-2]))*1000)+10
-            if self.controlInterface.activitySwitchButton.isChecked():
-                self.refresh_interval = 1000
-
-        print(f"update_timer refresh_interval:{self.refresh_interval}")
-        self.timer.setInterval(self.refresh_interval)
-        if not self.timer.isActive():
-            self.timer.start()
+        """ sampling or activity settings changed, redraws do not depend on them """
+        if self.controlInterface is not None and self.controlInterface.accSamplingButton.text()[:-2].isdigit():
+            self.activity_counter.set_sampling(int(self.controlInterface.accSamplingButton.text()[:-2]))
+        self.render_scheduler.request()
         self.trigger_resize()
 
-    def find_last_non_zero(self, lst):
-        for value in reversed(lst):
-            if value != 0:
-                return value
-        return None
+    def handle_batch_ready(self, address, size):
+        """ coalesce the batch notifications of all pipelines into one ingest """
+        if not self.ingest_pending:
+            self.ingest_pending = True
+            QTimer.singleShot(0, self.ingest)
+
+    def ingest(self):
+        """
+        Move the batches parsed by the ingest pipelines into the session buffers,
+        then the new samples of the shown device into the plot buffers
+        """
+        self.ingest_pending = False
+        if self.sessions is not None:
+            self.sessions.drain()
+        # the history lives in self.samples, the plot buffers only keep the visible window
+        rows, first = self.samples.since(max(self.plotted_seq, self.samples.total - self.win_size))
+        if not len(rows):
+            return
+        self.plotted_seq = self.samples.total
+        x = np.arange(first, self.plotted_seq, dtype=float)
+        values = np.vstack((rows['x'], rows['y'], rows['z']))
+        self.trace.extend(values, x)
+        self.decimator.extend(x, values)
+        self.autoscale.extend(x, values)
+
+        if self.controlInterface is not None and self.controlInterface.activitySwitchButton.isChecked():
+            # bars sit at the sequence number of the sample that completed them, like the XYZ curves
+            counts = rows['activity_count']
+            device_count = counts != NO_COUNT
+            if device_count.any():
+                self.activity_bars.set_spacing(1)
+                self.activity_bars.extend(counts[device_count], x[device_count])
+            if not device_count.all():
+                counts, ends = self.activity_counter.process(values[:, ~device_count])
+                if len(counts):
+                    # one bar over the samples of each epoch
+                    epoch = self.activity_counter.window_size_sec
+                    self.activity_bars.set_spacing(epoch)
+                    self.activity_bars.extend(counts, x[~device_count][ends] - (epoch - 1) / 2)
+                    # kept with the session so zoomed out views show them too
+                    self.samples.add_counts(x[~device_count][ends], counts)
+        self.render_scheduler.request()
 
     def update_plot(self):
-        timestamp, x, y, z, activity = None, 0, 0, 0, 0
-        if not self.first_packet_received:
+        with instrumentation.timer("render"):
+            self.render()
+        instrumentation.log_summary()
+
+    @property
+    def browsing_history(self):
+        """ the user panned or zoomed the XYZ plot, which turns its x auto range off """
+        return not self.plot_xyz_graph.getViewBox().autoRangeEnabled()[0]
+
+    def handle_x_range_changed(self):
+        if self.browsing_history:
+            self.render_scheduler.request()
+
+    def render(self):
+        activity = self.controlInterface is not None and self.controlInterface.activitySwitchButton.isChecked()
+        self.card2.setVisible(activity)
+        if self.browsing_history:
+            self.draw_history(activity)
             return
-        # if len(self.ble_data) > 1:
-        #     print(f"self.ble_data[-1]={self.ble_data[-1]}")
-        #print(f"refresh_interval:{self.refresh_interval}")
-        if len(self.xaxis) > 100000:
-            print("Reset data buffer")
-            self.xaxis = []
-            self.yaxis = []
-            self.zaxis = []
-            self.counts = []
-            self.ble_data = []
-
-        lx = self.find_last_non_zero(self.xaxis)
-        ly = self.find_last_non_zero(self.yaxis)
-        lz = self.find_last_non_zero(self.zaxis)
-        la = self.find_last_non_zero(self.counts)
-        #print(f"lx={lx} ly={ly} lz={lz} la={la}")
-
-        if len(self.ble_data) > 1:
-            timestamp, x, y, z, activity = self.ble_data[-1]
-
-        if lx == x and ly == y and lz == z: #incoming data but not acc x y z #todo clean
-            x, y, z, activity = 0, 0, 0, 0
-
-        if not self.incoming_data:
-            # print("No data to plot")
-            x, y, z, activity = 0, 0, 0, 0
-            self.counts.append(activity)
-            #return
-        # print(f"timestamp={timestamp} x={x} y={y} z={z} activity={activity}")
-        self.xaxis.append(x)
-        self.yaxis.append(y)
-        self.zaxis.append(z)
-        #self.time_xyz.append(timestamp)
-        self.time_xyz = list(range(len(self.xaxis)))
-        start_xyz = len(self.xaxis)-self.win_size
-        if start_xyz < 0:
-            start_xyz = 0
-        self.lineX.setData(self.time_xyz[start_xyz: len(self.xaxis)], self.xaxis[start_xyz: len(self.xaxis)])
-        self.lineY.setData(self.time_xyz[start_xyz: len(self.xaxis)], self.yaxis[start_xyz: len(self.xaxis)])
-        self.lineZ.setData(self.time_xyz[start_xyz: len(self.xaxis)], self.zaxis[start_xyz: len(self.xaxis)])
-
-        if self.controlInterface.activitySwitchButton.isChecked():
-            #self.plot_count_graph.setVisible(True)
-            self.card2.setVisible(True)
-            if activity is None:
-                self.activity_counter.add_data(x, y, z)
-                self.counts = self.activity_counter.get_activity_counts()
-            else:
-                self.counts.append(activity)
-
-            self.time_count = list(range(len(self.counts)))
-            start_count = len(self.counts)-self.win_size
-            if start_count < 0:
-                start_count = 0
-            # print(f"counts:{len(self.counts)} xaxis:{len(self.xaxis)} yaxis:{len(self.yaxis)} zaxis:{len(self.zaxis)}")
-            self.plot_count_graph.removeItem(self.bargraph)
-            self.time_count = self.time_count[start_count: len(self.counts)]
-            self.counts = self.counts[start_count: len(self.counts)]
-
-            self.bargraph = pg.BarGraphItem(x=self.time_count, height=self.counts, width=0.6, brush='#64B4BE')
-            # print("add...")
-            self.plot_count_graph.addItem(self.bargraph)
-            # self.incoming_data = False
-            #QTimer.singleShot(1500, lambda: setattr(self, 'incoming_data', False))
-        else:
-            #self.plot_count_graph.setVisible(False)
-            self.card2.setVisible(False)
-
-        # print(f"counts:{len(self.counts)} xaxis:{len(self.xaxis)} yaxis:{len(self.yaxis)} zaxis:{len(self.zaxis)}")
+        self.draw_xyz()
+        self.update_y_range()
+        if activity:
+            self.activity_bars.update()
+
+    def update_y_range(self):
+        """ Y range from the running extrema of the window instead of a rescan of the curves """
+        view = self.plot_xyz_graph.getViewBox()
+        if view.autoRangeEnabled()[1]:
+            # turned back on by the auto range button, that one rescans on every setData
+            view.enableAutoRange(y=False)
+            self.y_range = None
+            self.follow_y = True
+        if not self.follow_y:
+            return
+        y_range = self.autoscale.range()
+        if y_range is None or y_range == self.y_range:
+            return
+        self.y_range = y_range
+        lo, hi = y_range
+        if lo == hi:
+            lo, hi = lo - 0.5, hi + 0.5
+        view.setYRange(lo, hi, padding=0.05)
+
+    def handle_range_changed_manually(self, mask):
+        """ a manual Y zoom or pan holds until the auto range button is pressed """
+        if mask[1]:
+            self.follow_y = False
+
+    def set_robust_autoscale(self, robust):
+        self.autoscale.robust = robust
+        self.autoscale.clear()
+        self.autoscale.extend(self.trace.x(), self.trace.values())
+        self.render_scheduler.request()
+
+    def draw_history(self, activity=True):
+        """ min/max envelope of the visible range from the session summary, O(plot width) """
+        view = self.plot_xyz_graph.getViewBox()
+        (x0, x1), _ = view.viewRange()
+        x, lo, hi, _ = self.samples.summary(int(x0), int(np.ceil(x1)) + 1, max(1, int(view.width())))
+        time_xyz = np.repeat(x, 2)
+        envelope = np.empty((lo.shape[0], 2 * len(x)))
+        envelope[:, 0::2] = lo
+        envelope[:, 1::2] = hi
+        self.lineX.setData(time_xyz, envelope[0])
+        self.lineY.setData(time_xyz, envelope[1])
+        self.lineZ.setData(time_xyz, envelope[2])
+        if activity:
+            self.activity_bars.show_history(x, hi[3])
+
+    def draw_xyz(self):
+        """ push the decimated window to the curves, O(plot width) """
+        time_xyz = self.decimator.x()
+        self.lineX.setData(time_xyz, self.decimator.y(0))
+        self.lineY.setData(time_xyz, self.decimator.y(1))
+        self.lineZ.setData(time_xyz, self.decimator.y(2))
+
+    def resize_decimator(self):
+        """ one min/max bucket per pixel column of the XYZ plot """
+        columns = int(self.plot_xyz_graph.getViewBox().width())
+        if columns <= 0 or columns == self.decimator.columns:
+            return
+        self.decimator.resize(columns)
+        self.decimator.rebuild(self.trace.x(), self.trace.values())
+        self.draw_xyz()
 
     def add_control_interface(self, interface):
         self.controlInterface = interface
 
+    def add_session_manager(self, sessions):
+        self.sessions = sessions
+        self.sessions.batchReady.connect(self.handle_batch_ready)
+        self.sessions.sessionsChanged.connect(self.update_device_selector)
+
+    def update_device_selector(self):
+        """ one entry per session, the selector shows once several devices are connected """
+        if self.sessions is None:
+            return
+        combo = self.toolBar.deviceComboBox
+        combo.blockSignals(True)
+        combo.clear()
+        for session in self.sessions:
+            label = session.label if session.connected else f"{session.label} ({self.tr('disconnected')})"
+            combo.addItem(label, userData=session.address)
+        if self.session is not None:
+            combo.setCurrentIndex(combo.findData(self.session.address))
+        combo.blockSignals(False)
+        combo.setVisible(len(self.sessions) > 1)
+
+    def select_device(self, index):
+        address = self.toolBar.deviceComboBox.itemData(index)
+        session = self.sessions.get(address) if self.sessions is not None and address else None
+        if session is not None and session is not self.session:
+            self.set_active_session(session)
+            self.sessionSelected.emit(session.address)
+
+    def set_active_session(self, session):
+        """ show the samples of another device, its history stays in its own buffer """
+        if session is self.session:
+            return
+        self.session = session
+        self.samples = session.samples
+        self.hwid = session.label
+        self.trace.clear()
+        self.decimator.clear()
+        self.autoscale.clear()
+        self.activity_bars.clear()
+        self.activity_counter.clear()
+        self.plotted_seq = 0
+        self.update_device_selector()
+        self.render_scheduler.request()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        # catch up with what was ingested while hidden in a single redraw
+        self.render_scheduler.enabled = True
+        self.render_scheduler.flush()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        # ingest keeps filling the buffers, only painting stops
+        self.render_scheduler.enabled = False
+
     def trigger_resize(self):
         event = QResizeEvent(self.size(), self.size())
         self.resizeEvent(event)
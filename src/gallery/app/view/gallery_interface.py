@@ -9,7 +9,7 @@ from qfluentwidgets import (ScrollArea, PushButton, ToolButton, FluentIcon,
                             StrongBodyLabel, BodyLabel, toggleTheme, IndeterminateProgressBar, InfoBadge,
                             FluentStyleSheet, SwitchButton, TransparentPushButton, RoundMenu, SplitPushButton, Action,
                             DropDownPushButton, SpinBox, DatePicker, ProgressBar, InfoBar, InfoBarPosition,
-                            IndeterminateProgressRing)
+                            IndeterminateProgressRing, ComboBox)
 from ..common.config import cfg, FEEDBACK_URL, HELP_URL, EXAMPLE_URL
 from ..common.icon import Icon
 from ..common.style_sheet import StyleSheet
@@ -134,6 +134,7 @@ class ToolBar(QWidget):
         self.disconnectButton = PushButton(self.tr('Disconnect'), self, FluentIcon.REMOVE)
         #self.firmwareUpdateButton = PushButton(self.tr('Firmware Update'), self, FluentIcon.SETTING)
         self.exportButton = PushButton(self.tr('Export'), self, FluentIcon.SAVE)
+        self.deviceComboBox = ComboBox(self)
 
         #self.themeButton = ToolButton(FluentIcon.CONSTRACT, self)
         self.separator = SeparatorWidget(self)
@@ -192,6 +193,7 @@ class ToolBar(QWidget):
         self.buttonLayout.addWidget(self.disconnectButton, 0, Qt.AlignLeft)
         #self.buttonLayout.addWidget(self.firmwareUpdateButton, 0, Qt.AlignLeft)
         self.buttonLayout.addWidget(self.exportButton, 0, Qt.AlignLeft)
+        self.buttonLayout.addWidget(self.deviceComboBox, 0, Qt.AlignLeft)
         self.buttonLayout.addWidget(self.downloadButton, 0, Qt.AlignLeft)
         self.buttonLayout.addWidget(self.refreshButton, 0, Qt.AlignLeft)
         self.buttonLayout.addWidget(self.formatButton, 0, Qt.AlignLeft)
@@ -216,6 +218,7 @@ class ToolBar(QWidget):
             self.batteryWidget.setVisible(False)
 
         self.separator.setVisible(False)
+        self.deviceComboBox.setVisible(False)
         self.buttonLayout.setAlignment(Qt.AlignVCenter | Qt.AlignLeft)
 
         # self.themeButton.installEventFilter(ToolTipFilter(self.themeButton))
@@ -19,6 +19,7 @@ from ..common.translator import Translator
 from ..common.config import cfg
 from ..common.style_sheet import StyleSheet
 from ..common.trie import Trie
+from ..common.instrumentation import instrumentation
 
 import asyncio
 from dataclasses import dataclass
@@ -30,7 +31,11 @@ import qasync
 
 from bleak import BleakScanner, BleakClient, BleakError
 from bleak.backends.device import BLEDevice
-from ..ble.ble_client import QBleakClient
+from ..ble.session_manager import SessionManager
+from ..ble.reconnect import ReconnectSupervisor
+from ..ble.device_cache import DeviceCache
+from ..ble.simulator import SimulatedWearable, devices_from_env
+from ..stream.dispatcher import MessageDispatcher, UNKNOWN
 from datetime import datetime
 from PIL import ImageColor
 
@@ -74,6 +79,9 @@ class IconCard(QFrame):
         text = self.nameLabel.fontMetrics().elidedText(icon.value, Qt.ElideRight, 90)
         self.nameLabel.setText(device.name[0:10])
 
+    def setRssi(self, rssi):
+        self.setToolTip(f"{self.device.name}\n{self.device.address}\nRSSI: {rssi} dBm")
+
     def mouseReleaseEvent(self, e):
         if self.isSelected:
             return
@@ -166,6 +174,7 @@ class IconCardView(QWidget):
         self.cards = []     # type:List[IconCard]
         self.icons = []
         self.devices = []
+        self.cardsByAddress = {}
         self.currentIndex = -1
 
         self.__initWidget()
@@ -203,7 +212,21 @@ class IconCardView(QWidget):
         self.cards.append(card)
         self.icons.append(icon)
         self.devices.append(device)
+        self.cardsByAddress[device.address] = card
         self.flowLayout.addWidget(card)
+        return card
+
+    def addOrUpdateDevice(self, device: BLEDevice, rssi=None):
+        """ add a card for a new device, known devices only get their RSSI updated """
+        card = self.cardsByAddress.get(device.address)
+        if card is None:
+            icons = list(FluentIcon._member_map_.values())
+            if len(self.cards) >= len(icons):
+                return None
+            card = self.addIcon(icons[len(self.cards)], device)
+        if rssi is not None:
+            card.setRssi(rssi)
+        return card
     def setSelectedIcon(self, icon: FluentIcon, selected: bool=True):
         """ set selected icon """
         index = self.icons.index(icon)
@@ -298,26 +321,83 @@ class SearchAndConnectInterface(GalleryInterface):
     def curr_client(self):
         return self._client
 
+    @property
+    def curr_address(self):
+        return self._client.device.address if self._client is not None else None
+
     async def build_client(self, device):
-        if self._client is not None:
-            await self._client.stop()
-        self._client = QBleakClient(device)
-        self._client.messageChanged.connect(self.handle_message_changed)
-        self._client.messageDiconnect.connect(self.handle_message_disconnect)
-        await self._client.start()
+        # other devices keep streaming, commands and the streaming view follow the new one
+        session = await self.sessions.connect(device)
+        self._client = session.client
+        self.dataInterface.set_active_session(session)
 
     async def disconnect_client(self):
-        if self._client is not None:
-            await self._client.stop()
+        """ disconnect every session, the view has no handle on the ones in the background """
+        self.reconnector.cancel_all()
+        await self.sessions.disconnect_all()
 
-    async def update_timestamp(self):
-        print("Update Timestamp...")
+    def timestamp_command(self):
         now = datetime.now()
         #now = now + relativedelta(months=-1)
-        datetime_string = now.strftime("%y %m %d %H %M %S")
+        return now.strftime("%y %m %d %H %M %S")
+
+    async def update_timestamp(self):
+        print("Update Timestamp...")
+        datetime_string = self.timestamp_command()
         print(datetime_string)
         await self.handle_send(datetime_string)
 
+    async def resume_session(self, session):
+        """ called by the reconnect supervisor once a lost device is back """
+        if session.address == self.curr_address:
+            self._client = session.client
+        await session.client.write(self.timestamp_command().encode())
+
+    def handle_reconnecting(self, address, attempt, delay):
+        if address != self.curr_address:
+            return
+        InfoBar.info(
+            title=self.tr('Reconnecting'),
+            content=self.tr("Attempt {} in {:.0f}s, press Disconnect to stop.").format(attempt, delay),
+            orient=Qt.Horizontal,
+            isClosable=True,
+            position=InfoBarPosition.BOTTOM,
+            duration=3000,
+            parent=self.parent()
+        )
+
+    def handle_reconnect_failed(self, address):
+        if address != self.curr_address:
+            return
+        self.toolBar.disconnectButton.setEnabled(False)
+        self.toolBar.connectButton.setEnabled(True)
+        InfoBar.error(
+            title=self.tr('Reconnect failed'),
+            content=self.tr("The device did not come back, connect it again once it is in range."),
+            orient=Qt.Horizontal,
+            isClosable=True,
+            position=InfoBarPosition.BOTTOM,
+            duration=-1,
+            parent=self.parent()
+        )
+
+    def handle_reconnected(self, address):
+        if address != self.curr_address:
+            return
+        self.disconnected = False
+        self.toolBar.disconnectButton.setEnabled(True)
+        if self.toolBar.batteryWidget is not None:
+            self.toolBar.batteryWidget.setVisible(True)
+        InfoBar.success(
+            title=self.tr('Reconnected'),
+            content=self.tr("Streaming resumed, the interruption is recorded in the export."),
+            orient=Qt.Horizontal,
+            isClosable=True,
+            position=InfoBarPosition.BOTTOM,
+            duration=3000,
+            parent=self.parent()
+        )
+
     async def request_batt_level(self):
         print("Request batt level...")
         msg = f"batt_level"
@@ -401,13 +481,28 @@ class SearchAndConnectInterface(GalleryInterface):
         # else:
         #     print('Cancel button is pressed')
 
+    async def find_known_device(self):
+        """ short targeted scan for a device connected before, None on a miss """
+        device = await self.device_cache.find(timeout=2.0)
+        if device is not None:
+            card = self.iconView.addOrUpdateDevice(device)
+            if card is not None:
+                self.iconView.setSelectedIcon(card.icon)
+        return device
+
     @qasync.asyncSlot()
     async def handle_connect(self):
+        await self.stop_scan()
         self.toolBar.bar.start()
         self.toolBar.connectButton.setEnabled(False)
-        if not hasattr(self.iconView, 'currentDevice'):
-            return
-        device = self.iconView.currentDevice
+        device = getattr(self.iconView, 'currentDevice', None)
+        if device is None and len(self.device_cache) > 0:
+            device = await self.find_known_device()
+            if device is None:
+                # no known device around, fall back to a full scan
+                self.toolBar.bar.stop()
+                self.handle_scan()
+                return
         print("handle_connect", device)
         if device is None:
             self.toolBar.bar.stop()
@@ -416,6 +511,8 @@ class SearchAndConnectInterface(GalleryInterface):
             try:
                 await self.build_client(device)
                 print("connected")
+                if not isinstance(device.details, SimulatedWearable):
+                    self.device_cache.remember(device.address, name=device.name)
                 self.toolBar.disconnectButton.setEnabled(True)
                 #self.toolBar.firmwareUpdateButton.setEnabled(True)
                 if self.toolBar.batteryWidget is not None:
@@ -485,22 +582,53 @@ class SearchAndConnectInterface(GalleryInterface):
         self.iconView.cards = []
         self.iconView.icons = []
         self.iconView.devices = []
+        self.iconView.cardsByAddress = {}
         self.iconView.currentIndex = -1
 
 
+    def handle_detection(self, device: BLEDevice, adv):
+        """ scanner callback, cards appear as soon as a device advertises """
+        if device.name is None:
+            return
+        if device.address not in self.iconView.cardsByAddress:
+            print(f"ID:{len(self.devices)} NAME:{device.name} DEVICE:{device}")
+            self.devices.append(device)
+        card = self.iconView.addOrUpdateDevice(device, adv.rssi)
+        if card is not None and self.iconView.currentIndex < 0:
+            self.iconView.setSelectedIcon(card.icon)
+
+    async def stop_scan(self):
+        """ end a running scan early and wait for the scanner to stop """
+        if self._scan_stop is not None:
+            finished = self._scan_finished
+            self._scan_stop.set()
+            await finished.wait()
+
     @qasync.asyncSlot()
     async def handle_scan(self):
         print("handle_scan...")
         if hasattr(self, 'iconView'):
             self.vBoxLayout.removeWidget(self.iconView)
         self.iconView = IconCardView(self, toolBar=self.toolBar)
+        self.vBoxLayout.addWidget(self.iconView)
         if self.toolBar.batteryWidget is not None:
             self.toolBar.batteryWidget.setVisible(False)
         self.toolBar.bar.start()
         self.toolBar.scanButton.setEnabled(False)
         self.devices.clear()
+        for device in devices_from_env():
+            self.devices.append(device)
+            card = self.iconView.addOrUpdateDevice(device)
+            if card is not None and self.iconView.currentIndex < 0:
+                self.iconView.setSelectedIcon(card.icon)
+        self._scan_stop = asyncio.Event()
+        self._scan_finished = asyncio.Event()
         try:
-            devices = await BleakScanner.discover()
+            async with BleakScanner(detection_callback=self.handle_detection):
+                try:
+                    await asyncio.wait_for(self._scan_stop.wait(), self.scan_timeout)
+                except asyncio.TimeoutError:
+                    pass
         except Exception as e:
             print(e)
             self.toolBar.bar.stop()
@@ -512,43 +640,11 @@ class SearchAndConnectInterface(GalleryInterface):
                 print("ok button is pressed")
             else:
                 print('Cancel button is pressed')
-        print(devices)
-        self.devices.extend(devices)
-        print(self.devices)
-        self.iconView.flowLayout.removeAllWidgets()
-        self.iconView.icons.clear()
-        # self.iconView.trie.children.clear()
-        self.iconView.cards = []
-        self.iconView.icons = []
-        self.iconView.devices = []
-        self.iconView.currentIndex = -1
-
-        for i, device in enumerate(self.devices):
-            if device.name is None:
-                continue
-            print(f"ID:{i} NAME:{device.name} DEVICE:{device}")
-            icon = list(FluentIcon._member_map_.values())[i]
-            self.iconView.addIcon(icon, device)
-
-        if len(self.iconView.icons) == 0:
-            self.toolBar.bar.stop()
-            self.toolBar.scanButton.setEnabled(True)
-            self.devices.clear()
-            self.iconView.flowLayout.removeAllWidgets()
-            self.iconView.icons.clear()
-            self.iconView.cards = []
-            self.iconView.icons = []
-            self.iconView.devices = []
-            self.iconView.currentIndex = -1
-            return
-
-        if len(self.iconView.icons) > 0:
-            self.iconView.setSelectedIcon(self.iconView.icons[0])
+        finally:
+            self._scan_stop = None
+            self._scan_finished.set()
         print("Finish scanner")
         self.toolBar.bar.stop()
-        # if not self.layout_initialised:
-        #     self.layout_initialised = True
-        self.vBoxLayout.addWidget(self.iconView)
         self.toolBar.scanButton.setEnabled(True)
 
     def handle_message_disconnect(self, message):
@@ -556,7 +652,8 @@ class SearchAndConnectInterface(GalleryInterface):
         if hasattr(self, 'iconView'):
             self.vBoxLayout.removeWidget(self.iconView)
         self.toolBar.bar.stop()
-        self.toolBar.disconnectButton.setEnabled(False)
+        # while a reconnect is pending Disconnect stays available to cancel it
+        self.toolBar.disconnectButton.setEnabled(self.reconnector.pending(self.curr_address))
         #self.toolBar.firmwareUpdateButton.setEnabled(False)
         self.toolBar.connectButton.setEnabled(False)
         # InfoBar.warning(
@@ -575,84 +672,86 @@ class SearchAndConnectInterface(GalleryInterface):
             c.setVisible(False)
 
     def handle_message_changed(self, message):
-        self.dataInterface.incoming_data = True
-        if self.timer.isActive():
-            self.timer.stop()
-        self.timer.start(1000)
-
-        msg = message.decode()
-        print(f"Decoded data incoming msg:{message}")
-
-
-        if "batt" in msg:
-            split = msg.split('_')[1].split(':')
-            print(f"split={split}")
-            batt_lvl = int(split[0])
-            # batt_mV = int(split[1])
-            # soc_temp = int(split[2])
-            datetime_string = datetime.now().strftime("%y-%m-%dT%H:%M:%S")
-            print(f"batt_lvl={batt_lvl} timestamp={datetime_string}")
-
-            # with batt_log_file.open('a') as file:
-            #     log_message = f"{datetime_string},{batt_lvl},{batt_mV},{soc_temp}\n"
-            #     file.write(log_message)
-
-            self.battlvl = batt_lvl
-            GlobalStore().battlvl = self.battlvl
-            self.toolBar.updateBatteryLevel()
-
-        if "info" in msg:
-            data = msg.replace("info", '')
-            split = data.split(' ')
-            hwid = split[0]
-            self.xyz_sens = split[1]
-            self.xyz_sampling = split[2]
-            self.xyz_count = split[3]
-            self.flip_count = split[4]
-            self.msd_size = int(split[5])
-            self.msd_freemem = int(split[6])
-            self.battlvl = int(split[7])
-            GlobalStore().battlvl = self.battlvl
-            self.toolBar.updateBatteryLevel()
-
-            if self.toolBar.batteryWidget is not None:
-                self.toolBar.batteryWidget.setVisible(True)
-
-            self.sd_used_space = (self.msd_size - self.msd_freemem) / 1000
-            print(f"Acc conf: {split} xyz_sens: {self.xyz_sens} xyz_sampling: {self.xyz_sampling} "
-                  f" xyz_count: {self.xyz_count} flip_count: {self.flip_count}"
-                  f"sd_card_size: {self.msd_size} sd_freemem: {self.msd_freemem} sd_used_space: {self.sd_used_space} "
-                  f"batt_level: {self.battlvl}")
-
-            self.controlInterface.accSamplingButton.setText(f"{self.xyz_sampling}Hz")
-            self.controlInterface.accSensitivityButton.setText(f"{self.xyz_sens}G")
-            self.controlInterface.activitySwitchButton.setChecked(bool(int(self.xyz_count)))
-            self.controlInterface.bleFlipBox.setValue(int(self.flip_count))
-
-            # id, version_string = hwid.split(' ')
-            # parts = version_string.split('.')
-            self.info_string = f"Free space: {int(self.msd_freemem / 1000)}GB"
-            self.dataInterface.hwid = hwid
-
-        if 14 <= len(msg) <= 38 and 'hwid' not in msg and 'batt' not in msg:#todo clean up
-            print(f"MSG={msg}")
-            self.dataInterface.incoming_data = True
-            self.dataInterface.first_packet_received = True
-            self.dataInterface.ble_data.append(self.dataInterface.parse_ble_data(msg))
-
-        if msg == -9 or msg == "-9":
-            InfoBar.warning(
-                title=self.tr('Device disconnected'),
-                content=self.tr(f"The bluetooth connection was interrupted by the device"),
-                orient=Qt.Horizontal,
-                isClosable=True,
-                position=InfoBarPosition.BOTTOM,
-                duration=3000,  # won't disappear automatically
-                parent=self.parent()
-            )
-            self.toolBar.batteryWidget.setVisible(False)
-            self.toolBar.helpButton.setVisible(False)
-            self.disconnected = True
+        instrumentation.log_sampled("decode", "Decoded incoming msg:{}", message)
+        self.dispatcher.dispatch(bytes(message))
+
+    def handle_battery(self, frame: bytes):
+        split = frame.decode().split('_')[1].split(':')
+        print(f"split={split}")
+        batt_lvl = int(split[0])
+        # batt_mV = int(split[1])
+        # soc_temp = int(split[2])
+        datetime_string = datetime.now().strftime("%y-%m-%dT%H:%M:%S")
+        print(f"batt_lvl={batt_lvl} timestamp={datetime_string}")
+
+        # with batt_log_file.open('a') as file:
+        #     log_message = f"{datetime_string},{batt_lvl},{batt_mV},{soc_temp}\n"
+        #     file.write(log_message)
+
+        self.battlvl = batt_lvl
+        GlobalStore().battlvl = self.battlvl
+        self.toolBar.updateBatteryLevel()
+
+    def handle_info(self, frame: bytes):
+        data = frame.decode()[len("info"):]
+        split = data.split(' ')
+        hwid = split[0]
+        self.xyz_sens = split[1]
+        self.xyz_sampling = split[2]
+        self.xyz_count = split[3]
+        self.flip_count = split[4]
+        self.msd_size = int(split[5])
+        self.msd_freemem = int(split[6])
+        self.battlvl = int(split[7])
+        GlobalStore().battlvl = self.battlvl
+        self.toolBar.updateBatteryLevel()
+
+        if self.toolBar.batteryWidget is not None:
+            self.toolBar.batteryWidget.setVisible(True)
+
+        self.sd_used_space = (self.msd_size - self.msd_freemem) / 1000
+        print(f"Acc conf: {split} xyz_sens: {self.xyz_sens} xyz_sampling: {self.xyz_sampling} "
+              f" xyz_count: {self.xyz_count} flip_count: {self.flip_count}"
+              f"sd_card_size: {self.msd_size} sd_freemem: {self.msd_freemem} sd_used_space: {self.sd_used_space} "
+              f"batt_level: {self.battlvl}")
+
+        self.controlInterface.accSamplingButton.setText(f"{self.xyz_sampling}Hz")
+        self.controlInterface.accSensitivityButton.setText(f"{self.xyz_sens}G")
+        self.controlInterface.activitySwitchButton.setChecked(bool(int(self.xyz_count)))
+        self.controlInterface.bleFlipBox.setValue(int(self.flip_count))
+        self.dataInterface.update_timer()
+
+        # id, version_string = hwid.split(' ')
+        # parts = version_string.split('.')
+        self.info_string = f"Free space: {int(self.msd_freemem / 1000)}GB"
+        self.dataInterface.hwid = hwid
+        if self.curr_client is not None and not isinstance(self.curr_client.device.details, SimulatedWearable):
+            self.device_cache.remember(self.curr_address, hwid=hwid)
+
+    def handle_device_disconnect(self, frame: bytes):
+        InfoBar.warning(
+            title=self.tr('Device disconnected'),
+            content=self.tr(f"The bluetooth connection was interrupted by the device"),
+            orient=Qt.Horizontal,
+            isClosable=True,
+            position=InfoBarPosition.BOTTOM,
+            duration=3000,  # won't disappear automatically
+            parent=self.parent()
+        )
+        self.toolBar.batteryWidget.setVisible(False)
+        self.toolBar.helpButton.setVisible(False)
+        self.disconnected = True
+
+    def handle_unknown_message(self, frame: bytes):
+        instrumentation.log_sampled("decode", "Unhandled msg:{}", frame)
+
+    def handle_session_message(self, address, message):
+        if address == self.curr_address:
+            self.handle_message_changed(message)
+
+    def handle_session_disconnect(self, address):
+        if address == self.curr_address:
+            self.handle_message_disconnect(-9)
 
     @qasync.asyncSlot()
     async def handle_send(self, message):
@@ -671,14 +770,7 @@ class SearchAndConnectInterface(GalleryInterface):
         if message:
             await self.curr_client.write(message.encode())
 
-    def reset_incoming_data(self):
-        self.dataInterface.incoming_data = False
-
     def __init__(self, parent=None):
-        self.timer = QTimer()
-        self.timer.setSingleShot(True)
-        self.timer.timeout.connect(self.reset_incoming_data)
-
         self.timer_files = QTimer()
         self.timer_files.setInterval(1000)
         self.timer_files.setSingleShot(True)
@@ -698,7 +790,9 @@ class SearchAndConnectInterface(GalleryInterface):
         self.iconView = IconCardView(self)
         self.vBoxLayout.addWidget(self.iconView)
         self.layout_initialised = False
-        self.toolBar.connectButton.setEnabled(False)
+        self.device_cache = DeviceCache()
+        # known devices can be connected without scanning first
+        self.toolBar.connectButton.setEnabled(len(self.device_cache) > 0)
         self.toolBar.disconnectButton.setEnabled(False)
         self.toolBar.exportButton.setVisible(False)
         self.toolBar.helpButton.setVisible(False)
@@ -713,6 +807,23 @@ class SearchAndConnectInterface(GalleryInterface):
         self.toolBar.helpButton.clicked.connect(self.help)
 
         self._client = None
+        self._scan_stop = None
+        self.scan_timeout = 5.0
+        self.sessions = SessionManager(delimited=cfg.get(cfg.delimitedFrames), parent=self)
+        self.sessions.controlMessage.connect(self.handle_session_message)
+        self.sessions.sessionDisconnected.connect(self.handle_session_disconnect)
+        self.reconnector = ReconnectSupervisor(self.sessions, on_reconnected=self.resume_session,
+                                               max_attempts=cfg.get(cfg.reconnectAttempts), parent=self)
+        self.reconnector.reconnected.connect(self.handle_reconnected)
+        self.reconnector.reconnecting.connect(self.handle_reconnecting)
+        self.reconnector.gaveUp.connect(self.handle_reconnect_failed)
+        cfg.reconnectAttempts.valueChanged.connect(lambda value: setattr(self.reconnector, 'max_attempts', value))
+        # data frames are parsed by the session pipelines, only control messages get here
+        self.dispatcher = MessageDispatcher(stage="control")
+        self.dispatcher.register("battery", self.handle_battery, prefix=b"batt_")
+        self.dispatcher.register("info", self.handle_info, prefix=b"info")
+        self.dispatcher.register("disconnect", self.handle_device_disconnect, prefix=b"-9")
+        self.dispatcher.register(UNKNOWN, self.handle_unknown_message)
         self.xyz_sampling = 25
         self.xyz_sens = "1.2"
         self.xyz_count = 0
@@ -726,6 +837,14 @@ class SearchAndConnectInterface(GalleryInterface):
         self.vBoxLayout.setAlignment(Qt.AlignTop)
     def add_data_interface(self, interface):
         self.dataInterface = interface
+        self.dataInterface.add_session_manager(self.sessions)
+        self.dataInterface.sessionSelected.connect(self.handle_session_selected)
+
+    def handle_session_selected(self, address):
+        """ the streaming view switched device, commands and control messages follow it """
+        session = self.sessions.get(address)
+        if session is not None:
+            self._client = session.client
 
 
     def add_control_interface(self, interface):